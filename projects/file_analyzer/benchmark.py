@@ -0,0 +1,160 @@
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+import multiprocessing
+import platform
+import cProfile
+import tracemalloc
+from pathlib import Path
+
+from file_analyzer import FileSystemAnalyzer, ScanMetrics, HASH_ALGORITHMS
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# Extensions mixed into the synthetic tree so every MIME tier is exercised
+EXTENSIONS = ['.txt', '.json', '.jpg', '.log', '.dat', '']
+
+# Lognormal (median bytes, sigma) for each size distribution
+SIZE_DISTRIBUTIONS = {
+    'small': (4 * 1024, 1.0),
+    'mixed': (64 * 1024, 2.0),
+    'large': (8 * 1024 * 1024, 1.0),
+}
+
+def generate_tree(root, files, depth, fanout, size_dist, duplicate_ratio, seed):
+    """Create a synthetic directory tree and return (file count, total bytes)"""
+    rng = random.Random(seed)
+    median, sigma = SIZE_DISTRIBUTIONS[size_dist]
+
+    # Every directory path down to the requested depth
+    directories = [Path(root)]
+    level = [Path(root)]
+    for _ in range(depth):
+        level = [parent / f"d{i}" for parent in level for i in range(fanout)]
+        directories.extend(level)
+    for directory in directories:
+        directory.mkdir(parents=True, exist_ok=True)
+
+    written = []
+    total_bytes = 0
+    for index in range(files):
+        path = rng.choice(directories) / f"f{index}{rng.choice(EXTENSIONS)}"
+        if written and rng.random() < duplicate_ratio:
+            data = rng.choice(written).read_bytes()
+        else:
+            size = int(rng.lognormvariate(0, sigma) * median)
+            data = rng.randbytes(size)
+        path.write_bytes(data)
+        # Keep the pool of duplicate sources small so memory stays bounded
+        if len(written) < 256:
+            written.append(path)
+        total_bytes += len(data)
+    return files, total_bytes
+
+def peak_rss_kb():
+    """Peak resident set size of this process in KB, if the platform reports it"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS reports bytes, Linux reports kilobytes
+    return peak // 1024 if sys.platform == 'darwin' else peak
+
+def run_benchmark(root, args, file_count, total_bytes):
+    """Scan root once and return the measurements"""
+    metrics = ScanMetrics()
+    analyzer = FileSystemAnalyzer(
+        root, workers=args.workers, hash_algorithm=args.hash,
+        strict_mime=args.strict_mime, metrics=metrics
+    )
+    profiler = cProfile.Profile() if args.profile else None
+    if args.tracemalloc:
+        tracemalloc.start()
+
+    start = time.perf_counter()
+    if profiler:
+        profiler.enable()
+    analyzer.analyze_directory()
+    if profiler:
+        profiler.disable()
+    elapsed = time.perf_counter() - start
+    snapshot = metrics.snapshot()
+
+    result = {
+        'files': file_count,
+        'bytes': total_bytes,
+        'elapsed_s': round(elapsed, 4),
+        'files_per_s': round(file_count / elapsed, 1),
+        'mb_per_s': round(total_bytes / elapsed / 1_000_000, 1),
+        'peak_rss_kb': peak_rss_kb(),
+        # MIME and hash times are summed over worker threads
+        'phase_times_s': {phase: values['seconds'] for phase, values in snapshot['phases'].items()},
+        'errors': snapshot['errors'],
+        'slowest': snapshot['slowest'],
+        'duplicate_groups': len(analyzer.duplicate_files),
+    }
+
+    if args.tracemalloc:
+        memory_snapshot = tracemalloc.take_snapshot()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        result['tracemalloc_peak_kb'] = peak // 1024
+        result['tracemalloc_top'] = [
+            {'location': str(stat.traceback), 'size_kb': stat.size // 1024}
+            for stat in memory_snapshot.statistics('lineno')[:10]
+        ]
+    if profiler:
+        # Only the main thread is profiled: walking, merging and cache access
+        profiler.dump_stats(args.profile)
+        result['profile'] = args.profile
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark FileSystemAnalyzer on a synthetic tree")
+    parser.add_argument("--files", type=int, default=10_000, help="Number of files to generate")
+    parser.add_argument("--depth", type=int, default=3, help="Directory depth")
+    parser.add_argument("--fanout", type=int, default=4, help="Subdirectories per directory")
+    parser.add_argument("--size-dist", default="small", choices=SIZE_DISTRIBUTIONS, help="File size distribution")
+    parser.add_argument("--duplicate-ratio", type=float, default=0.1, help="Fraction of files that copy another file")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed for the tree")
+    parser.add_argument("--tree", help="Generate the tree here and keep it instead of using a temp directory")
+    parser.add_argument("--workers", type=int, help="Analyzer worker threads")
+    parser.add_argument("--hash", default="md5", choices=HASH_ALGORITHMS, help="Hash algorithm")
+    parser.add_argument("--strict-mime", action="store_true", help="Detect every file type with libmagic")
+    parser.add_argument("--profile", help="Write cProfile stats of the scan to this file")
+    parser.add_argument("--tracemalloc", action="store_true", help="Record Python memory allocations")
+    parser.add_argument("--json", help="Write results to this JSON file instead of stdout")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        root = args.tree or temp_dir
+        # Generate in a child process: ru_maxrss is a lifetime peak, so file data
+        # held here would otherwise show up as the scan's peak_rss_kb
+        with multiprocessing.get_context('spawn').Pool(1) as pool:
+            file_count, total_bytes = pool.apply(generate_tree, (
+                root, args.files, args.depth, args.fanout,
+                args.size_dist, args.duplicate_ratio, args.seed
+            ))
+        result = run_benchmark(root, args, file_count, total_bytes)
+
+    output = {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'parameters': {
+            key: value for key, value in vars(args).items() if key not in ('json', 'tree', 'profile')
+        },
+        'result': result,
+    }
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(output, f, indent=4)
+    else:
+        print(json.dumps(output, indent=4))
+
+if __name__ == "__main__":
+    main()
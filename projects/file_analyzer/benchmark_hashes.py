@@ -0,0 +1,90 @@
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+import tempfile
+from pathlib import Path
+
+from file_analyzer import HASH_ALGORITHMS, MMAP_THRESHOLD, hash_file
+
+# Read strategies passed through to hash_file
+METHODS = {
+    'readinto 4KB': {'chunk_size': 4096},
+    'readinto 1MB': {'chunk_size': 1024 * 1024},
+    'file_digest': {'chunk_size': None},
+    'mmap': {'chunk_size': 1024 * 1024, 'use_mmap': True},
+}
+
+def parse_size(text):
+    """Parse sizes such as 4K, 1M or 256M into bytes"""
+    units = {'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3}
+    text = text.strip().upper()
+    if text[-1] in units:
+        return int(float(text[:-1]) * units[text[-1]])
+    return int(text)
+
+def create_files(directory, sizes):
+    """Write one file of random data for each size"""
+    files = []
+    for size in sizes:
+        path = Path(directory) / f"bench_{size}.bin"
+        with open(path, "wb") as f:
+            remaining = size
+            while remaining:
+                block = min(remaining, 1024 * 1024)
+                f.write(os.urandom(block))
+                remaining -= block
+        files.append((path, size))
+    return files
+
+def time_hash(path, size, algorithm, options, min_time):
+    """Hash a file repeatedly for at least min_time seconds and return MB/s"""
+    runs = 0
+    start = time.perf_counter()
+    elapsed = 0.0
+    while elapsed < min_time or runs == 0:
+        hash_file(path, algorithm, **options)
+        runs += 1
+        elapsed = time.perf_counter() - start
+    return (size * runs) / elapsed / 1_000_000
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare hash backends and read strategies")
+    parser.add_argument("--sizes", default="4K,1M,64M", help="Comma separated file sizes")
+    parser.add_argument("--algorithms", default=",".join(HASH_ALGORITHMS), help="Comma separated algorithms")
+    parser.add_argument("--min-time", type=float, default=0.5, help="Seconds spent per measurement")
+    parser.add_argument("--json", help="Also write results to this JSON file")
+    args = parser.parse_args()
+
+    sizes = [parse_size(size) for size in args.sizes.split(",")]
+    algorithms = args.algorithms.split(",")
+    results = []
+
+    with tempfile.TemporaryDirectory() as directory:
+        files = create_files(directory, sizes)
+        print(f"{'algorithm':<10} {'method':<14} {'size':>12} {'MB/s':>10}")
+        for algorithm in algorithms:
+            for method, options in METHODS.items():
+                if method == 'file_digest' and not hasattr(hashlib, 'file_digest'):
+                    continue
+                for path, size in files:
+                    # mmap only applies above the threshold, so it would repeat readinto
+                    if method == 'mmap' and size < MMAP_THRESHOLD:
+                        continue
+                    throughput = time_hash(path, size, algorithm, options, args.min_time)
+                    results.append({
+                        'algorithm': algorithm,
+                        'method': method,
+                        'size': size,
+                        'mb_per_s': round(throughput, 1)
+                    })
+                    print(f"{algorithm:<10} {method:<14} {size:>12,} {throughput:>10.1f}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'python': sys.version.split()[0], 'results': results}, f, indent=4)
+
+if __name__ == "__main__":
+    main()
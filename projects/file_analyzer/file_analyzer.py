@@ -1,24 +1,562 @@
 import os
-import sys
 import hashlib
 import magic
 import datetime
+import time
+import heapq
+import itertools
 import pandas as pd
 import matplotlib.pyplot as plt
 from pathlib import Path
-from collections import defaultdict
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor, Future
+from array import array
 import logging
 import json
+import sqlite3
+import argparse
+import mmap
+import threading
+import mimetypes
+import csv
+import operator
+
+try:
+    import xxhash
+except ImportError:
+    xxhash = None
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:
+    pa = None
+
+# Bytes read from each end of a file for the partial hash stage
+PARTIAL_HASH_BLOCK = 64 * 1024
+
+# Read size used when hashlib.file_digest is unavailable or a chunk size is set
+DEFAULT_HASH_CHUNK = 1024 * 1024
+
+# Files at least this large are hashed through mmap when enabled
+MMAP_THRESHOLD = 64 * 1024 * 1024
+
+HASH_ALGORITHMS = ['md5', 'sha1', 'blake2b'] + (['xxh3_128', 'xxh64'] if xxhash else [])
+
+# Bytes read from the start of a file for signature matching
+SIGNATURE_BYTES = 32
+
+# (offset, magic bytes, MIME type) checked before falling back to libmagic.
+# Types use libmagic's names so counts from both tiers line up.
+FILE_SIGNATURES = [
+    (0, b'\x89PNG\r\n\x1a\n', 'image/png'),
+    (0, b'\xff\xd8\xff', 'image/jpeg'),
+    (0, b'GIF87a', 'image/gif'),
+    (0, b'GIF89a', 'image/gif'),
+    (0, b'%PDF-', 'application/pdf'),
+    (0, b'PK\x03\x04', 'application/zip'),
+    (0, b'\x1f\x8b', 'application/gzip'),
+    (0, b'BZh', 'application/x-bzip2'),
+    (0, b'\xfd7zXZ\x00', 'application/x-xz'),
+    (0, b"7z\xbc\xaf'\x1c", 'application/x-7z-compressed'),
+    (0, b'SQLite format 3\x00', 'application/x-sqlite3'),
+    (0, b'OggS', 'audio/ogg'),
+    (0, b'fLaC', 'audio/flac'),
+    (0, b'ID3', 'audio/mpeg'),
+    (8, b'WAVE', 'audio/x-wav'),
+    (8, b'AVI ', 'video/x-msvideo'),
+    (8, b'WEBP', 'image/webp'),
+    (4, b'ftyp', 'video/mp4'),
+    (0, b'\x7fELF', 'application/x-executable'),
+    (0, b'MZ', 'application/x-dosexec'),
+]
+
+# Rows per chunk when exporting per-file records
+EXPORT_CHUNK_ROWS = 100_000
+
+EXPORT_COLUMNS = ['path', 'size', 'mtime', 'mime', 'hash']
+
+_read_buffers = threading.local()
+
+# One libmagic handle per thread; magic.from_file shares a single locked handle
+_magic_handles = threading.local()
+
+def new_hasher(algorithm):
+    """Create a hash object for one of HASH_ALGORITHMS"""
+    if algorithm.startswith('xxh'):
+        if xxhash is None:
+            raise ValueError(f"Hash algorithm {algorithm} requires the xxhash package")
+        return getattr(xxhash, algorithm)()
+    return hashlib.new(algorithm)
+
+def hash_file(file_path, algorithm='md5', chunk_size=None, use_mmap=False):
+    """Hash a whole file and return its hex digest.
+
+    Large files are mapped with mmap when use_mmap is set. Otherwise
+    hashlib.file_digest is used if available and no chunk_size is given,
+    falling back to readinto() on a reused per-thread buffer.
+    """
+    hasher = new_hasher(algorithm)
+    with open(file_path, "rb") as f:
+        if use_mmap and os.fstat(f.fileno()).st_size >= MMAP_THRESHOLD:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                hasher.update(mapped)
+            return hasher.hexdigest()
+
+        if chunk_size is None and hasattr(hashlib, 'file_digest'):
+            return hashlib.file_digest(f, lambda: hasher).hexdigest()
+
+        chunk_size = chunk_size or DEFAULT_HASH_CHUNK
+        buffer = getattr(_read_buffers, 'buffer', None)
+        if buffer is None or len(buffer) != chunk_size:
+            buffer = _read_buffers.buffer = bytearray(chunk_size)
+        view = memoryview(buffer)
+        while True:
+            size = f.readinto(buffer)
+            if not size:
+                break
+            hasher.update(view[:size])
+    return hasher.hexdigest()
+
+# Cache writes between commits, so an interrupted scan keeps most of its work
+CACHE_COMMIT_INTERVAL = 10_000
+
+class ScanCache:
+    """SQLite index of stat data, MIME type and hashes from previous scans.
+
+    Entries are reused while a file's inode, size and mtime are unchanged.
+    MIME types are stored with the tier that detected them and are dropped
+    when the strict_mime setting changes. Changes are committed every
+    CACHE_COMMIT_INTERVAL writes. Entries not seen during a completed scan
+    are dropped when the cache is closed, so use one cache file per scanned
+    root.
+    """
+
+    def __init__(self, db_path, hash_algorithm='md5', strict_mime=False):
+        self.conn = sqlite3.connect(str(db_path))
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS files (
+                path TEXT PRIMARY KEY,
+                inode INTEGER,
+                size INTEGER,
+                mtime_ns INTEGER,
+                mime TEXT,
+                partial_hash TEXT,
+                full_hash TEXT,
+                scan_id INTEGER,
+                mime_method TEXT
+            )
+        """)
+        self.conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        columns = [row[1] for row in self.conn.execute("PRAGMA table_info(files)")]
+        if 'mime_method' not in columns:
+            # Caches written before the method was stored are classified again
+            self.conn.execute("ALTER TABLE files ADD COLUMN mime_method TEXT")
+            self.conn.execute("UPDATE files SET mime = NULL")
+        row = self.conn.execute("SELECT MAX(scan_id) FROM files").fetchone()
+        self.scan_id = (row[0] or 0) + 1
+        self.uncommitted = 0
+
+        # Hashes from another algorithm cannot be reused
+        row = self.conn.execute("SELECT value FROM meta WHERE key = 'hash_algorithm'").fetchone()
+        if row is None or row[0] != hash_algorithm:
+            self.conn.execute("UPDATE files SET partial_hash = NULL, full_hash = NULL")
+            self.conn.execute(
+                "INSERT OR REPLACE INTO meta VALUES ('hash_algorithm', ?)", (hash_algorithm,)
+            )
+
+        # Types from the cheap tiers cannot stand in for libmagic, and the reverse
+        mime_mode = 'strict' if strict_mime else 'layered'
+        row = self.conn.execute("SELECT value FROM meta WHERE key = 'mime_mode'").fetchone()
+        if row is None or row[0] != mime_mode:
+            self.conn.execute("UPDATE files SET mime = NULL, mime_method = NULL")
+            self.conn.execute("INSERT OR REPLACE INTO meta VALUES ('mime_mode', ?)", (mime_mode,))
+
+    def lookup(self, path, stats):
+        """Return the cached entry for path if the file is unchanged and its type is known"""
+        row = self.conn.execute(
+            "SELECT inode, size, mtime_ns, mime, mime_method FROM files WHERE path = ?", (path,)
+        ).fetchone()
+        if row is None or row[3] is None or row[:3] != (stats.st_ino, stats.st_size, stats.st_mtime_ns):
+            return None
+        self.conn.execute("UPDATE files SET scan_id = ? WHERE path = ?", (self.scan_id, path))
+        self.written()
+        return {'mime': row[3], 'method': row[4]}
+
+    def store(self, path, stats, mime, method):
+        """Record a new or changed file, discarding its hashes only if its contents changed"""
+        self.conn.execute("""
+            INSERT INTO files VALUES (?, ?, ?, ?, ?, NULL, NULL, ?, ?)
+            ON CONFLICT(path) DO UPDATE SET
+                partial_hash = CASE WHEN (inode, size, mtime_ns) = (excluded.inode, excluded.size, excluded.mtime_ns)
+                    THEN partial_hash END,
+                full_hash = CASE WHEN (inode, size, mtime_ns) = (excluded.inode, excluded.size, excluded.mtime_ns)
+                    THEN full_hash END,
+                inode = excluded.inode,
+                size = excluded.size,
+                mtime_ns = excluded.mtime_ns,
+                mime = excluded.mime,
+                mime_method = excluded.mime_method,
+                scan_id = excluded.scan_id
+        """, (path, stats.st_ino, stats.st_size, stats.st_mtime_ns, mime, self.scan_id, method))
+        self.written()
+
+    def get_hash(self, path, column):
+        """Return a cached 'partial_hash' or 'full_hash' for path"""
+        row = self.conn.execute(f"SELECT {column} FROM files WHERE path = ?", (path,)).fetchone()
+        return row[0] if row else None
+
+    def set_hash(self, path, column, value):
+        """Store a 'partial_hash' or 'full_hash' for path"""
+        self.conn.execute(f"UPDATE files SET {column} = ? WHERE path = ?", (value, path))
+        self.written()
+
+    def written(self):
+        """Count one write and commit once CACHE_COMMIT_INTERVAL have built up"""
+        self.uncommitted += 1
+        if self.uncommitted >= CACHE_COMMIT_INTERVAL:
+            self.conn.commit()
+            self.uncommitted = 0
+
+    def close(self, complete=True):
+        """Save the index, first dropping entries for files not seen if the scan completed"""
+        removed = 0
+        if complete:
+            removed = self.conn.execute(
+                "DELETE FROM files WHERE scan_id != ?", (self.scan_id,)
+            ).rowcount
+        self.conn.commit()
+        self.conn.close()
+        return removed
+
+class TopK:
+    """Keep the k items with the largest keys seen in a stream"""
+
+    def __init__(self, k):
+        self.k = k
+        self.heap = []
+        self.counter = itertools.count()
+
+    def accepts(self, key):
+        """Check whether an item with this key would enter the top k"""
+        return len(self.heap) < self.k or key > self.heap[0][0]
+
+    def push(self, key, item):
+        """Add an item, evicting the smallest one when full"""
+        # The counter breaks ties so items themselves are never compared
+        entry = (key, next(self.counter), item)
+        if len(self.heap) < self.k:
+            heapq.heappush(self.heap, entry)
+        elif key > self.heap[0][0]:
+            heapq.heapreplace(self.heap, entry)
+
+    def items(self):
+        """Return the tracked items, largest key first"""
+        return [item for _, _, item in sorted(self.heap, reverse=True)]
+
+class FileRecords:
+    """Array-backed store of scanned file paths, sizes, mtimes and types.
+
+    Directory prefixes and MIME types are interned once, so each file costs
+    one name string and a few array slots instead of a full path and dict.
+    Full hashes are only kept for the files duplicate detection hashed.
+    """
+
+    def __init__(self):
+        self.directories = []
+        self.directory_ids = {}
+        self.dir_ids = array('L')
+        self.names = []
+        self.sizes = array('Q')
+        self.mtimes = array('d')
+        self.mime_types = []
+        self.mime_type_ids = {}
+        self.type_ids = array('L')
+        self.hashes = {}
+
+    def __len__(self):
+        return len(self.sizes)
+
+    def add(self, path, size, mtime, mime):
+        """Store a file and return its record id"""
+        directory, name = os.path.split(path)
+        dir_id = self.directory_ids.get(directory)
+        if dir_id is None:
+            dir_id = self.directory_ids[directory] = len(self.directories)
+            self.directories.append(directory)
+        type_id = self.mime_type_ids.get(mime)
+        if type_id is None:
+            type_id = self.mime_type_ids[mime] = len(self.mime_types)
+            self.mime_types.append(mime)
+        self.dir_ids.append(dir_id)
+        self.names.append(name)
+        self.sizes.append(size)
+        self.mtimes.append(mtime)
+        self.type_ids.append(type_id)
+        return len(self.sizes) - 1
+
+    def path(self, record_id):
+        """Rebuild the full path of a record"""
+        return os.path.join(self.directories[self.dir_ids[record_id]], self.names[record_id])
+
+    def chunks(self, chunk_rows=EXPORT_CHUNK_ROWS):
+        """Yield records as dicts of EXPORT_COLUMNS lists, chunk_rows at a time"""
+        for start in range(0, len(self.sizes), chunk_rows):
+            record_ids = range(start, min(start + chunk_rows, len(self.sizes)))
+            yield {
+                'path': [self.path(record_id) for record_id in record_ids],
+                'size': self.sizes[record_ids.start:record_ids.stop].tolist(),
+                'mtime': self.mtimes[record_ids.start:record_ids.stop].tolist(),
+                'mime': [self.mime_types[self.type_ids[record_id]] for record_id in record_ids],
+                'hash': [self.hashes.get(record_id) for record_id in record_ids],
+            }
+
+    def size_groups(self):
+        """Yield (size, record_ids) for every size shared by more than one file"""
+        # Only the first id of each size is kept until a second file matches,
+        # instead of sorting a list of every record id
+        first_ids = {}
+        groups = {}
+        for record_id, file_size in enumerate(self.sizes):
+            group = groups.get(file_size)
+            if group is not None:
+                group.append(record_id)
+            elif file_size in first_ids:
+                groups[file_size] = array('L', (first_ids.pop(file_size), record_id))
+            else:
+                first_ids[file_size] = record_id
+        del first_ids
+        for file_size in sorted(groups):
+            yield file_size, groups.pop(file_size)
+
+class ScanMetrics:
+    """Per-phase timings, counters and progress reporting for a scan.
+
+    Phases are 'walk', 'stat', 'mime', 'partial_hash' and 'full_hash'. MIME
+    and hash times are summed over worker threads. While a scan runs, a
+    reporter thread passes the snapshot to progress_callback every
+    progress_interval seconds, logs it when log_progress is set, and writes
+    it to textfile in Prometheus format. Snapshots list the files each phase
+    is working on, so a hung read or libmagic call still shows up.
+    """
+
+    PHASES = ['walk', 'stat', 'mime', 'partial_hash', 'full_hash']
+
+    def __init__(self, slowest=10, progress_callback=None, progress_interval=10.0,
+                 log_progress=False, textfile=None):
+        self.progress_callback = progress_callback
+        self.progress_interval = progress_interval
+        self.log_progress = log_progress
+        self.textfile = textfile
+        self.logger = logging.getLogger('FileAnalyzer')
+        self.lock = threading.Lock()
+        self.phase_seconds = dict.fromkeys(self.PHASES, 0.0)
+        self.phase_counts = dict.fromkeys(self.PHASES, 0)
+        self.slowest = TopK(slowest)
+        self.files = 0
+        self.bytes = 0
+        self.errors = 0
+        self.stage = 'idle'
+        self.start_time = time.monotonic()
+        # Operations under way as token -> (phase, path, start time)
+        self.in_progress = {}
+        self.tokens = itertools.count()
+        self.stop_event = threading.Event()
+        self.reporter = None
+
+    def start(self):
+        """Reset the clock and start the reporter thread at the start of a scan"""
+        self.start_time = time.monotonic()
+        self.stage = 'scanning'
+        if self.progress_callback or self.log_progress or self.textfile:
+            self.stop_event.clear()
+            self.reporter = threading.Thread(target=self.run_reporter, name='scan-metrics', daemon=True)
+            self.reporter.start()
+
+    def run_reporter(self):
+        """Report every progress_interval seconds until finish() is called"""
+        while not self.stop_event.wait(self.progress_interval):
+            try:
+                self.report()
+            except Exception as e:
+                self.logger.error(f"Error reporting scan progress: {str(e)}")
+
+    def finish(self, stage='done'):
+        """Stop the reporter thread and report the final snapshot"""
+        self.stage = stage
+        if self.reporter:
+            self.stop_event.set()
+            self.reporter.join()
+            self.reporter = None
+        self.report()
+
+    def begin(self, phase, path):
+        """Mark an operation as started and return a token for end()"""
+        token = next(self.tokens)
+        with self.lock:
+            self.in_progress[token] = (phase, path, time.perf_counter())
+        return token
+
+    def end(self, token):
+        """Record the duration of an operation started with begin()"""
+        end_time = time.perf_counter()
+        with self.lock:
+            phase, path, start = self.in_progress.pop(token)
+        self.add_time(phase, end_time - start, path)
+
+    def add_time(self, phase, seconds, path=None):
+        """Record one timed operation, safe to call from worker threads"""
+        with self.lock:
+            self.phase_seconds[phase] += seconds
+            self.phase_counts[phase] += 1
+            if path is not None and self.slowest.accepts(seconds):
+                self.slowest.push(seconds, {'path': path, 'phase': phase, 'seconds': round(seconds, 6)})
+
+    def timed(self, phase, func, path_of=lambda arg: arg):
+        """Wrap a one-argument function so each call is timed under phase"""
+        def wrapper(arg):
+            token = self.begin(phase, path_of(arg))
+            try:
+                return func(arg)
+            finally:
+                self.end(token)
+        return wrapper
+
+    def timed_iter(self, phase, iterable):
+        """Time the work done producing each item of an iterable"""
+        iterator = iter(iterable)
+        while True:
+            start = time.perf_counter()
+            item = next(iterator, None)
+            self.add_time(phase, time.perf_counter() - start)
+            if item is None:
+                return
+            yield item
+
+    def add_file(self, size):
+        """Count a scanned file"""
+        self.files += 1
+        self.bytes += size
+
+    def add_error(self):
+        """Count an error, safe to call from worker threads"""
+        with self.lock:
+            self.errors += 1
+
+    def snapshot(self):
+        """Return the current metrics as a dict"""
+        elapsed = time.monotonic() - self.start_time
+        now = time.perf_counter()
+        with self.lock:
+            seconds = dict(self.phase_seconds)
+            counts = dict(self.phase_counts)
+            slowest = self.slowest.items()
+            running = list(self.in_progress.values())
+        in_progress = defaultdict(list)
+        for phase, path, start in sorted(running, key=operator.itemgetter(2)):
+            in_progress[phase].append({'path': path, 'seconds': round(now - start, 3)})
+        # The walker performs the stat calls, so report walking without them
+        seconds['walk'] = max(seconds['walk'] - seconds['stat'], 0.0)
+        return {
+            'stage': self.stage,
+            'elapsed_s': round(elapsed, 3),
+            'files': self.files,
+            'bytes': self.bytes,
+            'errors': self.errors,
+            'files_per_s': round(self.files / elapsed, 1) if elapsed else 0.0,
+            'phases': {
+                phase: {'seconds': round(seconds[phase], 4), 'count': counts[phase]}
+                for phase in self.PHASES
+            },
+            'slowest': slowest,
+            # Longest running first
+            'in_progress': dict(in_progress)
+        }
+
+    def report(self):
+        """Pass a snapshot to the callback, the log and the textfile"""
+        snapshot = self.snapshot()
+        if self.progress_callback:
+            self.progress_callback(snapshot)
+        if self.log_progress:
+            self.logger.info(
+                f"[{snapshot['stage']}] {snapshot['files']:,} files, "
+                f"{snapshot['bytes'] / 1_000_000:,.1f} MB, {snapshot['errors']} errors, "
+                f"{snapshot['files_per_s']:,.1f} files/s"
+            )
+            for phase, operations in snapshot['in_progress'].items():
+                oldest = operations[0]
+                if oldest['seconds'] >= self.progress_interval:
+                    self.logger.warning(
+                        f"{len(operations)} {phase} operations running, "
+                        f"oldest {oldest['path']} for {oldest['seconds']:,.1f}s"
+                    )
+        if self.textfile:
+            self.write_textfile(snapshot)
+        return snapshot
+
+    def write_textfile(self, snapshot):
+        """Write a snapshot in Prometheus text format, replacing the file atomically"""
+        lines = [
+            "# TYPE file_analyzer_files_total counter",
+            f"file_analyzer_files_total {snapshot['files']}",
+            "# TYPE file_analyzer_bytes_total counter",
+            f"file_analyzer_bytes_total {snapshot['bytes']}",
+            "# TYPE file_analyzer_errors_total counter",
+            f"file_analyzer_errors_total {snapshot['errors']}",
+            "# TYPE file_analyzer_elapsed_seconds gauge",
+            f"file_analyzer_elapsed_seconds {snapshot['elapsed_s']}",
+            "# TYPE file_analyzer_phase_seconds_total counter",
+        ]
+        lines += [
+            f'file_analyzer_phase_seconds_total{{phase="{phase}"}} {values["seconds"]}'
+            for phase, values in snapshot['phases'].items()
+        ]
+        lines.append("# TYPE file_analyzer_phase_operations_total counter")
+        lines += [
+            f'file_analyzer_phase_operations_total{{phase="{phase}"}} {values["count"]}'
+            for phase, values in snapshot['phases'].items()
+        ]
+        lines.append("# TYPE file_analyzer_in_progress gauge")
+        lines += [
+            f'file_analyzer_in_progress{{phase="{phase}"}} {len(snapshot["in_progress"].get(phase, []))}'
+            for phase in self.PHASES
+        ]
+        lines.append("# TYPE file_analyzer_oldest_in_progress_seconds gauge")
+        lines += [
+            f'file_analyzer_oldest_in_progress_seconds{{phase="{phase}"}} {operations[0]["seconds"]}'
+            for phase, operations in snapshot['in_progress'].items()
+        ]
+        temp_path = f"{self.textfile}.tmp"
+        with open(temp_path, 'w') as f:
+            f.write("\n".join(lines) + "\n")
+        os.replace(temp_path, self.textfile)
 
 class FileSystemAnalyzer:
-    def __init__(self, root_path):
+    def __init__(self, root_path, cache_path=None, workers=None, top_k=10,
+                 hash_algorithm='md5', hash_chunk_size=None, use_mmap=False,
+                 strict_mime=False, metrics=None):
         self.root_path = Path(root_path)
+        self.workers = workers or min(32, (os.cpu_count() or 1) + 4)
+        self.hash_algorithm = hash_algorithm
+        self.hash_chunk_size = hash_chunk_size
+        self.use_mmap = use_mmap
+        self.strict_mime = strict_mime
+        self.metrics = metrics
+        mimetypes.init()  # Load the tables once, before worker threads use them
+        new_hasher(hash_algorithm)  # Fail early on unknown algorithms
         self.setup_logging()
+        self.cache = ScanCache(cache_path, hash_algorithm, strict_mime) if cache_path else None
         self.file_types = defaultdict(int)
+        self.file_type_sources = defaultdict(lambda: defaultdict(int))
         self.size_distribution = defaultdict(int)
-        self.large_files = []
+        self.large_files = TopK(top_k)
+        self.large_file_count = 0
+        self.recent_files = TopK(top_k)
+        self.recent_file_count = 0
         self.duplicate_files = defaultdict(list)
-        self.recent_files = []
+        self.records = FileRecords()
         
     def setup_logging(self):
         logging.basicConfig(
@@ -31,69 +569,262 @@ class FileSystemAnalyzer:
         )
         self.logger = logging.getLogger('FileAnalyzer')
 
+    def log_error(self, message):
+        """Log a scan error and count it in the metrics"""
+        self.logger.error(message)
+        if self.metrics:
+            self.metrics.add_error()
+
     def calculate_file_hash(self, file_path):
-        """Calculate MD5 hash of a file"""
+        """Calculate the hash of a file with the configured algorithm"""
         try:
-            hash_md5 = hashlib.md5()
+            return hash_file(file_path, self.hash_algorithm, self.hash_chunk_size, self.use_mmap)
+        except Exception as e:
+            self.log_error(f"Error calculating hash for {file_path}: {str(e)}")
+            return None
+
+    def calculate_partial_hash(self, file_path, file_size):
+        """Calculate the hash of the first and last blocks of a file"""
+        try:
+            hasher = new_hasher(self.hash_algorithm)
             with open(file_path, "rb") as f:
-                for chunk in iter(lambda: f.read(4096), b""):
-                    hash_md5.update(chunk)
-            return hash_md5.hexdigest()
+                hasher.update(f.read(PARTIAL_HASH_BLOCK))
+                f.seek(max(file_size - PARTIAL_HASH_BLOCK, 0))
+                hasher.update(f.read(PARTIAL_HASH_BLOCK))
+            return hasher.hexdigest()
         except Exception as e:
-            self.logger.error(f"Error calculating hash for {file_path}: {str(e)}")
+            self.log_error(f"Error calculating partial hash for {file_path}: {str(e)}")
             return None
 
     def get_file_type(self, file_path):
         """Determine file type using python-magic"""
         try:
-            return magic.from_file(str(file_path), mime=True)
+            detector = getattr(_magic_handles, 'detector', None)
+            if detector is None:
+                detector = _magic_handles.detector = magic.Magic(mime=True)
+            return detector.from_file(str(file_path))
         except Exception as e:
-            self.logger.error(f"Error determining file type for {file_path}: {str(e)}")
+            self.log_error(f"Error determining file type for {file_path}: {str(e)}")
             return "unknown/unknown"
 
+    def match_signature(self, file_path):
+        """Match the first bytes of a file against FILE_SIGNATURES"""
+        try:
+            with open(file_path, "rb") as f:
+                head = f.read(SIGNATURE_BYTES)
+        except OSError:
+            return None
+        for offset, signature, mime in FILE_SIGNATURES:
+            if head.startswith(signature, offset):
+                return mime
+        return None
+
+    def classify_file(self, file_path):
+        """Return (mime, method), trying cheap tiers before libmagic.
+
+        The extension table is tried first, then magic-number signatures, and
+        libmagic only runs for files neither can classify. Extensions mapped to
+        application/octet-stream (.bin, .exe, .so, ...) say nothing about the
+        content, so those files go on to the later tiers. With strict_mime
+        every file goes to libmagic.
+        """
+        if not self.strict_mime:
+            mime, _ = mimetypes.guess_type(file_path, strict=False)
+            if mime and mime != 'application/octet-stream':
+                return mime, 'extension'
+            mime = self.match_signature(file_path)
+            if mime:
+                return mime, 'signature'
+        return self.get_file_type(file_path), 'libmagic'
+
+    def stat_entry(self, entry):
+        """Return stat data for a DirEntry, which caches it after the first call"""
+        if self.metrics is None:
+            return entry.stat()
+        token = self.metrics.begin('stat', entry.path)
+        try:
+            return entry.stat()
+        finally:
+            self.metrics.end(token)
+
+    def walk_files(self):
+        """Yield (path, stats) for every file under root_path using os.scandir"""
+        stack = [str(self.root_path)]
+        while stack:
+            directory = stack.pop()
+            try:
+                with os.scandir(directory) as entries:
+                    for entry in entries:
+                        try:
+                            if entry.is_dir(follow_symlinks=False):
+                                stack.append(entry.path)
+                            elif entry.is_file():
+                                yield entry.path, self.stat_entry(entry)
+                        except OSError as e:
+                            self.log_error(f"Error processing {entry.path}: {str(e)}")
+            except OSError as e:
+                self.log_error(f"Error reading directory {directory}: {str(e)}")
+
     def analyze_directory(self):
         """Analyze the directory structure and collect statistics"""
-        self.logger.info(f"Starting analysis of {self.root_path}")
+        self.logger.info(f"Starting analysis of {self.root_path} with {self.workers} workers")
+        # Matches the previous "(now - mtime).days <= 7" check
+        self.recent_cutoff = time.time() - 8 * 24 * 60 * 60
         
-        for file_path in self.root_path.rglob("*"):
-            if file_path.is_file():
-                try:
-                    # Get file stats
-                    stats = file_path.stat()
-                    file_size = stats.st_size
-                    mod_time = datetime.datetime.fromtimestamp(stats.st_mtime)
-                    
-                    # Update file type statistics
-                    file_type = self.get_file_type(file_path)
-                    self.file_types[file_type] += 1
-                    
-                    # Update size distribution
-                    size_category = self.categorize_size(file_size)
-                    self.size_distribution[size_category] += 1
-                    
-                    # Track large files (>100MB)
-                    if file_size > 100_000_000:
-                        self.large_files.append({
-                            'path': str(file_path),
-                            'size': file_size,
-                            'type': file_type
-                        })
-                    
-                    # Track recently modified files (last 7 days)
-                    if (datetime.datetime.now() - mod_time).days <= 7:
-                        self.recent_files.append({
-                            'path': str(file_path),
-                            'modified': mod_time.strftime('%Y-%m-%d %H:%M:%S'),
-                            'type': file_type
-                        })
+        walker = self.walk_files()
+        classify = self.classify_file
+        if self.metrics:
+            self.metrics.start()
+            walker = self.metrics.timed_iter('walk', walker)
+            classify = self.metrics.timed('mime', classify)
+        
+        completed = False
+        try:
+            with ThreadPoolExecutor(max_workers=self.workers) as pool:
+                # Files waiting on MIME detection, bounded so the walker cannot run far ahead
+                pending = deque()
+                max_pending = self.workers * 4
+                for path, stats in walker:
+                    # Reuse unchanged cache entries, otherwise sniff the type on the pool
+                    cached = self.cache.lookup(path, stats) if self.cache else None
+                    if cached:
+                        file_type = Future()
+                        file_type.set_result((cached['mime'], cached['method']))
+                    else:
+                        file_type = pool.submit(classify, path)
+                    pending.append((path, stats, file_type, cached is None))
                     
-                    # Check for duplicates
-                    file_hash = self.calculate_file_hash(file_path)
-                    if file_hash:
-                        self.duplicate_files[file_hash].append(str(file_path))
-                        
-                except Exception as e:
-                    self.logger.error(f"Error processing {file_path}: {str(e)}")
+                    while pending and (len(pending) > max_pending or pending[0][2].done()):
+                        self.record_file(*pending.popleft())
+                
+                while pending:
+                    self.record_file(*pending.popleft())
+
+                if self.metrics:
+                    self.metrics.stage = 'hashing'
+                self.find_duplicates(pool)
+            completed = True
+        finally:
+            if self.cache:
+                # An interrupted scan saw only part of the tree, so nothing is pruned
+                removed = self.cache.close(complete=completed)
+                self.logger.info(f"Scan cache updated, {removed} stale entries removed")
+            if self.metrics:
+                self.metrics.finish('done' if completed else 'failed')
+
+    def record_file(self, path, stats, file_type, is_new):
+        """Merge one scanned file into the aggregate statistics"""
+        try:
+            file_type, method = file_type.result()
+            if is_new and self.cache:
+                self.cache.store(path, stats, file_type, method)
+            
+            file_size = stats.st_size
+            
+            # Update file type statistics
+            self.file_types[file_type] += 1
+            self.file_type_sources[file_type][method] += 1
+            
+            # Update size distribution
+            size_category = self.categorize_size(file_size)
+            self.size_distribution[size_category] += 1
+            
+            # Track large files (>100MB)
+            if file_size > 100_000_000:
+                self.large_file_count += 1
+                if self.large_files.accepts(file_size):
+                    self.large_files.push(file_size, {
+                        'path': path,
+                        'size': file_size,
+                        'type': file_type
+                    })
+            
+            # Track recently modified files (last 7 days)
+            if stats.st_mtime > self.recent_cutoff:
+                self.recent_file_count += 1
+                if self.recent_files.accepts(stats.st_mtime):
+                    mod_time = datetime.datetime.fromtimestamp(stats.st_mtime)
+                    self.recent_files.push(stats.st_mtime, {
+                        'path': path,
+                        'modified': mod_time.strftime('%Y-%m-%d %H:%M:%S'),
+                        'type': file_type
+                    })
+            
+            # Keep a compact record for duplicate detection
+            self.records.add(path, file_size, stats.st_mtime, file_type)
+            
+            if self.metrics:
+                self.metrics.add_file(file_size)
+                
+        except Exception as e:
+            self.log_error(f"Error processing {path}: {str(e)}")
+
+    def hash_files(self, pool, items, column, compute):
+        """Hash (path, size) items on the pool, reusing and updating cached hashes"""
+        hashes = {}
+        if self.metrics:
+            compute = self.metrics.timed(column, compute, operator.itemgetter(0))
+        
+        def collect(item, future):
+            # The cache connection belongs to this thread, so results are stored here
+            value = future.result()
+            if value:
+                hashes[item[0]] = value
+                if self.cache:
+                    self.cache.set_hash(item[0], column, value)
+        
+        # Submitted hashes, bounded like the MIME queue in analyze_directory
+        pending = deque()
+        max_pending = self.workers * 4
+        for item in items:
+            value = self.cache.get_hash(item[0], column) if self.cache else None
+            if value:
+                hashes[item[0]] = value
+                continue
+            pending.append((item, pool.submit(compute, item)))
+            while pending and (len(pending) > max_pending or pending[0][1].done()):
+                collect(*pending.popleft())
+        while pending:
+            collect(*pending.popleft())
+        return hashes
+
+    def find_duplicates(self, pool):
+        """Detect duplicates by size, then partial hash, then full hash"""
+        small_files = []
+        large_files = []
+        for file_size, record_ids in self.records.size_groups():
+            # Small files are read completely by the partial hash anyway
+            target = small_files if file_size <= 2 * PARTIAL_HASH_BLOCK else large_files
+            target.extend(
+                (self.records.path(record_id), file_size, record_id) for record_id in record_ids
+            )
+
+        partial_hashes = self.hash_files(
+            pool, large_files, 'partial_hash',
+            lambda item: self.calculate_partial_hash(item[0], item[1])
+        )
+        partial_groups = defaultdict(list)
+        for item in large_files:
+            if item[0] in partial_hashes:
+                partial_groups[(item[1], partial_hashes[item[0]])].append(item)
+
+        candidates = small_files + [
+            item for group in partial_groups.values() if len(group) > 1 for item in group
+        ]
+        full_hashes = self.hash_files(
+            pool, candidates, 'full_hash',
+            lambda item: self.calculate_file_hash(item[0])
+        )
+        groups = defaultdict(list)
+        for path, _, record_id in candidates:
+            if path in full_hashes:
+                groups[full_hashes[path]].append(path)
+                self.records.hashes[record_id] = full_hashes[path]
+        
+        # Only keep hashes shared by several files
+        for file_hash, paths in groups.items():
+            if len(paths) > 1:
+                self.duplicate_files[file_hash] = paths
 
     def categorize_size(self, size):
         """Categorize file size into ranges"""
@@ -133,14 +864,20 @@ class FileSystemAnalyzer:
         report = {
             'timestamp': datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
             'root_path': str(self.root_path),
+            'hash_algorithm': self.hash_algorithm,
             'statistics': {
                 'file_types': dict(self.file_types),
+                'file_type_sources': {k: dict(v) for k, v in self.file_type_sources.items()},
                 'size_distribution': dict(self.size_distribution),
-                'large_files': self.large_files[:10],  # Top 10 largest files
-                'recent_files': self.recent_files[:10],  # 10 most recent files
+                'large_file_count': self.large_file_count,
+                'large_files': self.large_files.items(),  # Top K largest files
+                'recent_file_count': self.recent_file_count,
+                'recent_files': self.recent_files.items(),  # K most recent files
                 'duplicates': {k: v for k, v in self.duplicate_files.items() if len(v) > 1}
             }
         }
+        if self.metrics:
+            report['metrics'] = self.metrics.snapshot()
         
         # Save report as JSON
         output_dir = Path("analysis_output")
@@ -150,18 +887,77 @@ class FileSystemAnalyzer:
             json.dump(report, f, indent=4)
         
         # Generate Excel report
-        df_files = pd.DataFrame(self.recent_files)
+        df_files = pd.DataFrame(report['statistics']['recent_files'])
         df_files.to_excel(output_dir / 'recent_files.xlsx', index=False)
         
         return report
 
+    def export_records(self, output_path):
+        """Stream every scanned record to Parquet, Arrow IPC or CSV in chunks.
+
+        The format follows the file extension (.parquet, .arrow, .csv).
+        Without pyarrow, Parquet and Arrow requests fall back to CSV.
+        """
+        output_path = Path(output_path)
+        export_format = output_path.suffix.lower().lstrip('.')
+        if export_format in ('parquet', 'arrow') and pa is None:
+            self.logger.warning("pyarrow is not installed, exporting records as CSV")
+            export_format = 'csv'
+            output_path = output_path.with_suffix('.csv')
+        
+        if export_format in ('parquet', 'arrow'):
+            schema = pa.schema([
+                ('path', pa.string()),
+                ('size', pa.uint64()),
+                ('mtime', pa.float64()),
+                ('mime', pa.string()),
+                ('hash', pa.string())
+            ])
+            if export_format == 'parquet':
+                writer = pa.parquet.ParquetWriter(str(output_path), schema)
+            else:
+                writer = pa.ipc.new_file(str(output_path), schema)
+            with writer:
+                for chunk in self.records.chunks():
+                    writer.write_batch(pa.RecordBatch.from_pydict(chunk, schema=schema))
+        else:
+            with open(output_path, 'w', newline='') as f:
+                writer = csv.writer(f)
+                writer.writerow(EXPORT_COLUMNS)
+                for chunk in self.records.chunks():
+                    writer.writerows(zip(*(chunk[column] for column in EXPORT_COLUMNS)))
+        
+        self.logger.info(f"Exported {len(self.records)} records to {output_path}")
+        return output_path
+
 def main():
-    if len(sys.argv) != 2:
-        print("Usage: python file_analyzer.py <directory_path>")
-        sys.exit(1)
+    parser = argparse.ArgumentParser(description="Analyze a directory tree")
+    parser.add_argument("directory", help="Directory to analyze")
+    parser.add_argument("--cache", help="SQLite scan cache reused between runs")
+    parser.add_argument("--workers", type=int, help="Threads used for hashing and MIME detection")
+    parser.add_argument("--top", type=int, default=10, help="Largest and most recent files to report")
+    parser.add_argument("--hash", default="md5", choices=HASH_ALGORITHMS, help="Hash algorithm")
+    parser.add_argument("--chunk-size", type=int, help="Read size in bytes for hashing")
+    parser.add_argument("--mmap", action="store_true", help="Hash large files through mmap")
+    parser.add_argument("--strict-mime", action="store_true", help="Detect every file type with libmagic")
+    parser.add_argument("--export", help="Write every scanned record to a .parquet, .arrow or .csv file")
+    parser.add_argument("--progress-interval", type=float, help="Log scan progress every N seconds")
+    parser.add_argument("--metrics-textfile", help="Write scan metrics in Prometheus text format to this file")
+    args = parser.parse_args()
     
-    directory = sys.argv[1]
-    analyzer = FileSystemAnalyzer(directory)
+    metrics = None
+    if args.progress_interval or args.metrics_textfile:
+        metrics = ScanMetrics(
+            progress_interval=args.progress_interval or 10.0,
+            log_progress=bool(args.progress_interval),
+            textfile=args.metrics_textfile
+        )
+    
+    analyzer = FileSystemAnalyzer(
+        args.directory, cache_path=args.cache, workers=args.workers, top_k=args.top,
+        hash_algorithm=args.hash, hash_chunk_size=args.chunk_size, use_mmap=args.mmap,
+        strict_mime=args.strict_mime, metrics=metrics
+    )
     
     print("Starting file system analysis...")
     analyzer.analyze_directory()
@@ -172,13 +968,17 @@ def main():
     print("Generating report...")
     report = analyzer.generate_report()
     
+    if args.export:
+        print("Exporting scan records...")
+        analyzer.export_records(args.export)
+    
     print("\nAnalysis complete! Check the 'analysis_output' directory for results.")
     
     # Print summary
     print("\nQuick Summary:")
     print(f"Total file types found: {len(report['statistics']['file_types'])}")
-    print(f"Large files (>100MB): {len(report['statistics']['large_files'])}")
-    print(f"Recent files (7 days): {len(report['statistics']['recent_files'])}")
+    print(f"Large files (>100MB): {report['statistics']['large_file_count']}")
+    print(f"Recent files (7 days): {report['statistics']['recent_file_count']}")
     print(f"Duplicate file groups: {len(report['statistics']['duplicates'])}")
 
 if __name__ == "__main__":
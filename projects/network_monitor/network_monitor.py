@@ -4,12 +4,609 @@ import speedtest
 import socket
 import datetime
 import json
+import os
+import asyncio
+import itertools
+import ipaddress
+import time
+import struct
+import argparse
+import tempfile
+import threading
+import socketserver
+import heapq
+from collections import defaultdict
+from array import array
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 from pathlib import Path
 
-class NetworkMonitor:
+# Seconds each report probe may take before the report is returned without it
+PROBE_TIMEOUTS = {
+    "system_info": 5,
+    "network_interfaces": 5,
+    "internet_speed": 60,
+    "common_ports": 10,
+}
+
+# Seconds that rarely changing facts are reused between reports
+STATIC_INFO_TTL = 24 * 60 * 60
+
+# Default port of the built-in link test server, shared by TCP and UDP
+LINK_TEST_PORT = 5201
+
+# Buffer used for link test transfers
+LINK_TEST_BUFFER = 1024 * 1024
+
+# Longest transfer in seconds the link test server runs for one stream
+LINK_TEST_MAX_DURATION = 60
+
+# Size of each UDP latency probe
+PING_PAYLOAD = 64
+
+# Default port of the daemon's metrics endpoint
+DAEMON_PORT = 9105
+
+# Per-interface counters reported as rates by monitor_network_usage
+RATE_FIELDS = ["bytes_sent", "bytes_recv", "packets_sent", "packets_recv"]
+
+def expand_hosts(targets):
+    """Yield host strings from names, addresses and CIDR networks"""
+    if isinstance(targets, str):
+        targets = [targets]
+    for target in targets:
+        try:
+            network = ipaddress.ip_network(target, strict=False)
+        except ValueError:
+            yield target
+            continue
+        if network.num_addresses == 1:
+            yield str(network.network_address)
+        else:
+            yield from (str(address) for address in network.hosts())
+
+def expand_ports(ports):
+    """Yield port numbers from ints, range objects and "start-end" strings"""
+    if isinstance(ports, (int, str)):
+        ports = [ports]
+    for port in ports:
+        if isinstance(port, range):
+            yield from port
+        elif isinstance(port, str) and "-" in port:
+            start, end = port.split("-")
+            yield from range(int(start), int(end) + 1)
+        else:
+            yield int(port)
+
+def counter_delta(previous, current):
+    """Difference between two counter readings, allowing for wraps and resets"""
+    if current >= previous:
+        return current - previous
+    # A 32-bit counter wrapped, otherwise the counter was reset
+    if previous < 2 ** 32:
+        return current + 2 ** 32 - previous
+    return current
+
+def process_counter_delta(previous, current):
+    """Return the increase of a 64-bit per-process counter, treating a decrease as a reset"""
+    return current - previous if current >= previous else 0
+
+async def resolve_host(host):
+    """Return one address for host, or None if it cannot be resolved"""
+    try:
+        ipaddress.ip_address(host)
+        return host
+    except ValueError:
+        pass
+    try:
+        infos = await asyncio.get_running_loop().getaddrinfo(host, None, type=socket.SOCK_STREAM)
+    except OSError:
+        return None
+    return infos[0][4][0] if infos else None
+
+async def probe_port(host, port, timeout, address=None):
+    """Try one TCP connection and return (host, port, "Open" or "Closed").
+
+    Pass the resolved address to skip a name lookup for every port.
+    """
+    try:
+        _, writer = await asyncio.wait_for(asyncio.open_connection(address or host, port), timeout)
+    except (OSError, asyncio.TimeoutError):
+        return host, port, "Closed"
+    writer.close()
+    try:
+        await writer.wait_closed()
+    except OSError:
+        pass
+    return host, port, "Open"
+
+def payload_file():
+    """Return a temporary file of LINK_TEST_BUFFER bytes for socket.sendfile"""
+    f = tempfile.TemporaryFile()
+    f.write(bytes(LINK_TEST_BUFFER))
+    f.flush()
+    return f
+
+def recv_exact(sock, size):
+    """Receive exactly size bytes from a socket"""
+    data = bytearray()
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            raise ConnectionError("Connection closed before all data arrived")
+        data += chunk
+    return bytes(data)
+
+class ThroughputHandler(socketserver.BaseRequestHandler):
+    """Receive an upload and report its size, or send data for the requested time.
+
+    Clients send a mode byte and the test duration in seconds, which is
+    capped at the server's max_duration so no client can make it transfer
+    without limit.
+    """
+
+    def handle(self):
+        try:
+            mode, duration = struct.unpack("!cd", recv_exact(self.request, 9))
+        except (OSError, struct.error):
+            return
+        deadline = time.monotonic() + min(max(duration, 0), self.server.max_duration)
+        if mode == b"U":
+            # recv_into a reused buffer avoids allocating per read
+            buffer = bytearray(LINK_TEST_BUFFER)
+            received = 0
+            # Allow for data still in flight when the client's time is up
+            self.request.settimeout(5)
+            try:
+                while time.monotonic() < deadline + 5:
+                    size = self.request.recv_into(buffer)
+                    if not size:
+                        break
+                    received += size
+                self.request.sendall(struct.pack("!Q", received))
+            except OSError:
+                pass  # Client stalled or closed the connection
+        elif mode == b"D":
+            with payload_file() as f:
+                try:
+                    while time.monotonic() < deadline:
+                        self.request.sendfile(f, 0)
+                except OSError:
+                    pass  # Client closed the connection
+
+class EchoHandler(socketserver.BaseRequestHandler):
+    """Echo UDP latency probes back to the sender"""
+
+    def handle(self):
+        data, sock = self.request
+        sock.sendto(data, self.client_address)
+
+class ReusableTCPServer(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+class LinkTestServer:
+    """TCP throughput and UDP echo server used by NetworkMonitor.test_link"""
+
+    def __init__(self, host="0.0.0.0", port=LINK_TEST_PORT, max_duration=LINK_TEST_MAX_DURATION):
+        self.tcp_server = ReusableTCPServer((host, port), ThroughputHandler)
+        self.tcp_server.max_duration = max_duration
+        # Port 0 picks a free TCP port, and UDP then shares it
+        self.port = self.tcp_server.server_address[1]
+        self.udp_server = socketserver.UDPServer((host, self.port), EchoHandler)
+
+    def start(self):
+        """Serve in background threads"""
+        for server in (self.tcp_server, self.udp_server):
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        """Stop serving and close the sockets"""
+        for server in (self.tcp_server, self.udp_server):
+            server.shutdown()
+            server.server_close()
+
+def run_throughput_stream(host, port, mode, duration, results, index):
+    """Run one upload ("U") or download ("D") stream and store (bytes, seconds)"""
+    try:
+        with socket.create_connection((host, port), timeout=10) as sock:
+            sock.sendall(struct.pack("!cd", mode, duration))
+            start = time.monotonic()
+            deadline = start + duration
+            if mode == b"U":
+                with payload_file() as f:
+                    while time.monotonic() < deadline:
+                        sock.sendfile(f, 0)
+                sock.shutdown(socket.SHUT_WR)
+                # The server reports what actually arrived
+                transferred = struct.unpack("!Q", recv_exact(sock, 8))[0]
+            else:
+                buffer = bytearray(LINK_TEST_BUFFER)
+                transferred = 0
+                while time.monotonic() < deadline:
+                    size = sock.recv_into(buffer)
+                    if not size:
+                        break
+                    transferred += size
+            results[index] = (transferred, time.monotonic() - start)
+    except OSError as e:
+        results[index] = e
+
+def measure_throughput(host, port, mode, duration, streams):
+    """Run parallel streams and return the combined rate in Mbps"""
+    results = [None] * streams
+    threads = [
+        threading.Thread(target=run_throughput_stream, args=(host, port, mode, duration, results, index))
+        for index in range(streams)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    errors = [result for result in results if isinstance(result, Exception)]
+    if errors:
+        raise errors[0]
+    total_bytes = sum(transferred for transferred, _ in results)
+    elapsed = max(seconds for _, seconds in results)
+    return total_bytes * 8 / elapsed / 1_000_000
+
+def measure_latency(host, port, count=50, interval=0.02, timeout=0.5):
+    """Send UDP probes and return RTT statistics in ms, jitter and loss"""
+    rtts = []
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        sock.settimeout(timeout)
+        sock.connect((socket.gethostbyname(host), port))
+        for seq in range(count):
+            sent = time.perf_counter_ns()
+            sock.send(struct.pack("!IQ", seq, sent).ljust(PING_PAYLOAD, b"\0"))
+            deadline = time.monotonic() + timeout
+            while time.monotonic() < deadline:
+                try:
+                    reply = sock.recv(PING_PAYLOAD)
+                except (socket.timeout, ConnectionRefusedError):
+                    break
+                # Ignore late replies to earlier probes
+                if struct.unpack("!I", reply[:4])[0] == seq:
+                    rtts.append((time.perf_counter_ns() - sent) / 1_000_000)
+                    break
+            time.sleep(interval)
+    
+    result = {"sent": count, "received": len(rtts), "loss_percent": 100 * (count - len(rtts)) / count}
+    if rtts:
+        ordered = sorted(rtts)
+        pick = lambda point: ordered[min(int(len(ordered) * point / 100), len(ordered) - 1)]
+        result.update({
+            "min": ordered[0],
+            "avg": sum(rtts) / len(rtts),
+            "p50": pick(50),
+            "p95": pick(95),
+            "p99": pick(99),
+            "max": ordered[-1],
+            # Mean difference between consecutive RTTs, as in RFC 3550
+            "jitter": sum(abs(b - a) for a, b in zip(rtts, rtts[1:])) / max(len(rtts) - 1, 1)
+        })
+    return result
+
+# Rollup resolutions kept by UsageHistory: (bucket seconds, buckets kept)
+HISTORY_RESOLUTIONS = {
+    "1s": (1, 3600),
+    "1m": (60, 24 * 60),
+    "1h": (3600, 30 * 24),
+}
+
+# Seconds of history the longest rollup holds
+HISTORY_RETENTION = max(width * capacity for width, capacity in HISTORY_RESOLUTIONS.values())
+
+class RollupSeries:
+    """Fixed-size ring of per-bucket averages backed by arrays"""
+
+    def __init__(self, width, capacity):
+        self.width = width
+        self.capacity = capacity
+        self.times = array("d", bytes(8 * capacity))
+        self.values = array("d", bytes(8 * capacity))
+        self.head = 0
+        self.count = 0
+        self.bucket = None
+        self.bucket_sum = 0.0
+        self.bucket_samples = 0
+
+    def add(self, timestamp, value):
+        """Add a sample, closing the current bucket when a new one starts"""
+        bucket = int(timestamp // self.width)
+        if bucket != self.bucket:
+            self.flush()
+            self.bucket = bucket
+        self.bucket_sum += value
+        self.bucket_samples += 1
+
+    def flush(self):
+        """Append the average of the open bucket to the ring"""
+        if not self.bucket_samples:
+            return
+        self.times[self.head] = self.bucket * self.width
+        self.values[self.head] = self.bucket_sum / self.bucket_samples
+        self.head = (self.head + 1) % self.capacity
+        self.count = min(self.count + 1, self.capacity)
+        self.bucket_sum = 0.0
+        self.bucket_samples = 0
+
+    def items(self, since=None):
+        """Return closed buckets as (bucket start, average), oldest first"""
+        start = (self.head - self.count) % self.capacity
+        result = []
+        for offset in range(self.count):
+            index = (start + offset) % self.capacity
+            if since is None or self.times[index] >= since:
+                result.append((self.times[index], self.values[index]))
+        return result
+
+class UsageHistory:
+    """Bounded history of per-interface rates from monitor_network_usage.
+
+    Rates are rolled up into 1s, 1m and 1h ring buffers. When log_file is
+    set, every sample is also appended to it as one compact JSON line, and
+    the file is rotated to a single ".1" backup once it exceeds max_bytes.
+    Interfaces not seen for longer than the longest rollup are dropped.
+    """
+
+    def __init__(self, log_file=None, max_bytes=50_000_000):
+        self.log_file = Path(log_file) if log_file else None
+        self.max_bytes = max_bytes
+        self.series = {}
+        self.last_seen = {}
+        self.last_prune = None
+        self.handle = None
+
+    def add(self, sample, write=True, resolutions=HISTORY_RESOLUTIONS):
+        """Record a sample yielded by monitor_network_usage"""
+        timestamp = sample["time"]
+        for name, rates in sample["interfaces"].items():
+            self.last_seen[name] = timestamp
+            for field in RATE_FIELDS:
+                key = (name, field)
+                if key not in self.series:
+                    self.series[key] = {
+                        resolution: RollupSeries(width, capacity)
+                        for resolution, (width, capacity) in HISTORY_RESOLUTIONS.items()
+                    }
+                for resolution in resolutions:
+                    self.series[key][resolution].add(timestamp, rates[f"{field}_per_s"])
+        if self.last_prune is None or timestamp - self.last_prune > HISTORY_RESOLUTIONS["1h"][0]:
+            self.prune(timestamp)
+        if write and self.log_file:
+            self.write(timestamp, sample["interfaces"])
+
+    def prune(self, now):
+        """Drop the series of interfaces that have not been seen within the retention"""
+        self.last_prune = now
+        expired = [name for name, seen in self.last_seen.items() if now - seen > HISTORY_RETENTION]
+        for name in expired:
+            del self.last_seen[name]
+            for field in RATE_FIELDS:
+                self.series.pop((name, field), None)
+
+    def write(self, timestamp, interfaces):
+        """Append one sample to the log file, rotating it when it grows too large"""
+        if self.handle is None:
+            self.handle = open(self.log_file, "a", buffering=1)
+        line = json.dumps({
+            "t": timestamp,
+            "i": {name: [rates[f"{field}_per_s"] for field in RATE_FIELDS] for name, rates in interfaces.items()}
+        }, separators=(",", ":"))
+        self.handle.write(line + "\n")
+        if self.handle.tell() > self.max_bytes:
+            self.handle.close()
+            self.handle = None
+            self.log_file.replace(self.log_file.with_name(self.log_file.name + ".1"))
+
+    @staticmethod
+    def seek_time(f, since):
+        """Move f to the first line with a timestamp of at least since.
+
+        Lines are appended in time order, so the offset is found by bisecting
+        the file instead of parsing every older line.
+        """
+        low, high = 0, os.fstat(f.fileno()).st_size
+        while low < high:
+            middle = (low + high) // 2
+            f.seek(middle)
+            if middle:
+                f.readline()  # Skip to the start of the next full line
+            line = f.readline()
+            try:
+                timestamp = json.loads(line)["t"]
+            except ValueError:
+                timestamp = None  # End of file or a partially written line
+            if timestamp is not None and timestamp < since:
+                low = middle + 1
+            else:
+                high = middle
+        f.seek(low)
+        if low:
+            f.readline()
+
+    def load(self):
+        """Rebuild the rollups from the records of the log file and its backup they can still hold"""
+        if not self.log_file:
+            return
+        now = time.time()
+        # Oldest timestamp each resolution keeps
+        windows = {resolution: now - width * capacity for resolution, (width, capacity) in HISTORY_RESOLUTIONS.items()}
+        for path in (self.log_file.with_name(self.log_file.name + ".1"), self.log_file):
+            if not path.exists():
+                continue
+            with open(path, "rb") as f:
+                self.seek_time(f, now - HISTORY_RETENTION)
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue  # Partially written last line
+                    self.add({
+                        "time": record["t"],
+                        "interfaces": {
+                            name: {f"{field}_per_s": value for field, value in zip(RATE_FIELDS, values)}
+                            for name, values in record["i"].items()
+                        }
+                    }, write=False, resolutions=[
+                        resolution for resolution, start in windows.items() if record["t"] >= start
+                    ])
+
+    def query(self, interface, field="bytes_recv", resolution="1m", since=None):
+        """Return (bucket start, average rate) pairs for one interface and field"""
+        series = self.series.get((interface, field))
+        if series is None:
+            return []
+        return series[resolution].items(since)
+
+    def percentiles(self, interface, field="bytes_recv", window=300, resolution="1s", points=(50, 95, 99)):
+        """Return rate percentiles over the last window seconds"""
+        values = sorted(value for _, value in self.query(interface, field, resolution, time.time() - window))
+        if not values:
+            return {}
+        result = {}
+        for point in points:
+            # Linear interpolation between closest ranks
+            rank = (len(values) - 1) * point / 100
+            lower = int(rank)
+            upper = min(lower + 1, len(values) - 1)
+            result[f"p{point}"] = values[lower] + (values[upper] - values[lower]) * (rank - lower)
+        return result
+
+    def close(self):
+        """Close the log file"""
+        if self.handle:
+            self.handle.close()
+            self.handle = None
+
+class ProcessTrafficSampler:
+    """Attribute connections and I/O rates to processes between samples.
+
+    psutil has no per-process network counters, so traffic is estimated from
+    each process's I/O counters. On Linux these are read_chars/write_chars,
+    which include socket reads and writes but also file I/O. Only processes
+    that own inet connections are read, and Process objects and previous
+    counters are kept between samples so each tick only handles changes.
+    Counters are keyed on (pid, create time), so a reused pid starts over.
+    """
+
     def __init__(self):
+        self.processes = {}
+        self.previous = {}
+        self.previous_time = None
+
+    def read_counters(self, pid):
+        """Return ((pid, create time), (read, write)) byte counters for pid, or None if unavailable"""
+        process = self.processes.get(pid)
+        # is_running() compares create times, so it is False once the pid is reused
+        if process is None or not process.is_running():
+            process = self.processes[pid] = psutil.Process(pid)
+        try:
+            io = process.io_counters()
+        except AttributeError:
+            return None  # Not provided on macOS
+        # read_chars/write_chars include sockets, read_bytes/write_bytes only disk
+        return (pid, process.create_time()), (
+            getattr(io, "read_chars", io.read_bytes), getattr(io, "write_chars", io.write_bytes)
+        )
+
+    def sample(self, top=10):
+        """Take one sample and return the top talkers since the previous one"""
+        now = time.monotonic()
+        connections = defaultdict(lambda: {"connections": 0, "established": 0})
+        try:
+            inet_connections = psutil.net_connections(kind="inet")
+        except psutil.AccessDenied:
+            # macOS only lists connections system-wide for root
+            return {
+                "timestamp": time.strftime("%Y-%m-%d %H:%M:%S"),
+                "error": "Access denied listing connections, run as root",
+                "processes": 0,
+                "unattributed_connections": 0,
+                "top_talkers": []
+            }
+        for conn in inet_connections:
+            # Connections of other users' processes may have no pid without privileges
+            entry = connections[conn.pid]
+            entry["connections"] += 1
+            if conn.status == psutil.CONN_ESTABLISHED:
+                entry["established"] += 1
+        
+        counters = {}
+        for pid in connections:
+            if pid is None:
+                continue
+            try:
+                io = self.read_counters(pid)
+            except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
+                io = None
+            if io is None:
+                self.processes.pop(pid, None)
+            else:
+                counters[io[0]] = io[1]
+        
+        # Forget processes that exited or closed all their connections
+        for pid in set(self.processes) - {pid for pid, _ in counters}:
+            del self.processes[pid]
+        
+        talkers = []
+        period = now - self.previous_time if self.previous_time else None
+        for key, (read, write) in counters.items():
+            previous = self.previous.get(key)
+            if previous is None or not period:
+                continue
+            pid = key[0]
+            talkers.append({
+                "pid": pid,
+                "name": self.process_name(pid),
+                "connections": connections[pid]["connections"],
+                "established": connections[pid]["established"],
+                "read_bytes_per_s": process_counter_delta(previous[0], read) / period,
+                "write_bytes_per_s": process_counter_delta(previous[1], write) / period
+            })
+        self.previous = counters
+        self.previous_time = now
+        
+        unattributed = connections.get(None, {}).get("connections", 0)
+        result = {
+            "timestamp": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "processes": len(counters),
+            "unattributed_connections": unattributed,
+            "top_talkers": heapq.nlargest(
+                top, talkers, key=lambda talker: talker["read_bytes_per_s"] + talker["write_bytes_per_s"]
+            )
+        }
+        if not hasattr(psutil.Process, "io_counters"):
+            result["error"] = "Per-process I/O counters are not available on this platform"
+        return result
+
+    def process_name(self, pid):
+        """Return a process name, or an empty string if it cannot be read"""
+        try:
+            return self.processes[pid].name()
+        except (KeyError, psutil.Error):
+            return ""
+
+class NetworkMonitor:
+    def __init__(self, keep_history=False, link_test_target=None):
         self.log_path = Path("network_logs")
         self.log_path.mkdir(exist_ok=True)
+        self.history = UsageHistory(self.log_path / "usage_history.jsonl") if keep_history else None
+        if self.history:
+            self.history.load()
+        self.cache = {}
+        # (host, port[, duration, streams]) of a link test server used instead of speedtest.net
+        self.link_test_target = link_test_target
+
+    def cached(self, key, ttl, compute):
+        """Return a cached value for key, computing it again once ttl seconds pass"""
+        entry = self.cache.get(key)
+        if entry and time.monotonic() < entry[0]:
+            return entry[1]
+        value = compute()
+        self.cache[key] = (time.monotonic() + ttl, value)
+        return value
 
     def get_system_info(self):
         """Get basic system information"""
@@ -57,42 +654,181 @@ class NetworkMonitor:
                 "error": f"Failed to test internet speed: {str(e)}"
             }
 
-    def check_port_status(self, host, ports):
+    def test_link(self, host, port=LINK_TEST_PORT, duration=5, streams=4):
+        """Test throughput and latency against a LinkTestServer"""
+        try:
+            print(f"Testing download speed from {host}...")
+            download_speed = measure_throughput(host, port, b"D", duration, streams)
+            print(f"Testing upload speed to {host}...")
+            upload_speed = measure_throughput(host, port, b"U", duration, streams)
+            print("Measuring latency...")
+            latency = measure_latency(host, port)
+            
+            result = {
+                "target": f"{host}:{port}",
+                "download_speed": f"{download_speed:.2f} Mbps",
+                "upload_speed": f"{upload_speed:.2f} Mbps",
+                "packet_loss": f"{latency['loss_percent']:.1f}%"
+            }
+            if latency["received"]:
+                result.update({
+                    "ping": f"{latency['avg']:.2f} ms",
+                    "jitter": f"{latency['jitter']:.2f} ms",
+                    "latency_ms": {
+                        key: round(latency[key], 3) for key in ("min", "p50", "p95", "p99", "max")
+                    }
+                })
+            return result
+        except Exception as e:
+            return {
+                "error": f"Failed to test link to {host}: {str(e)}"
+            }
+
+    def check_port_status(self, host, ports, concurrency=500, timeout=1):
         """Check if specific ports are open"""
-        results = {}
-        for port in ports:
-            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            sock.settimeout(1)
-            result = sock.connect_ex((host, port))
-            results[port] = "Open" if result == 0 else "Closed"
-            sock.close()
-        return results
-
-    def monitor_network_usage(self, duration=60):
-        """Monitor network usage for a specified duration in seconds"""
-        start_time = datetime.datetime.now()
-        start_bytes = psutil.net_io_counters()
+        results = self.scan_ports(host, ports, concurrency, timeout)
+        return {port: results[(host, port)] for port in expand_ports(ports)}
+
+    def scan_ports(self, targets, ports, concurrency=500, timeout=1):
+        """Scan hosts and ports concurrently and return {(host, port): status}"""
+        async def collect():
+            return {
+                (host, port): status
+                async for host, port, status in self.scan_ports_async(targets, ports, concurrency, timeout)
+            }
+        return asyncio.run(collect())
+
+    async def scan_ports_async(self, targets, ports, concurrency=500, timeout=1):
+        """Yield (host, port, status) tuples as connection attempts complete.
+
+        targets is a host name, address or CIDR network, or a list of them.
+        ports is a list of ports, range objects or "start-end" strings. At
+        most concurrency connections are open at once.
+        """
+        ports = list(expand_ports(ports))
+        probes = ((host, port) for host in expand_hosts(targets) for port in ports)
+        # Each host is resolved once, before its first probe. Probes are grouped
+        # by host, so only the current host's address needs to be kept.
+        addresses = {}
+        in_flight = set()
+        while True:
+            # Top up the in-flight set lazily so huge sweeps use bounded memory
+            for host, port in itertools.islice(probes, concurrency - len(in_flight)):
+                if host not in addresses:
+                    addresses = {host: await resolve_host(host)}
+                if addresses[host] is None:
+                    yield host, port, "Closed"
+                    continue
+                in_flight.add(asyncio.ensure_future(probe_port(host, port, timeout, addresses[host])))
+            if not in_flight:
+                return
+            done, in_flight = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                yield task.result()
+
+    def monitor_network_usage(self, duration=60, interval=1.0):
+        """Monitor network usage for a specified duration in seconds.
+
+        Yields one sample every interval seconds with cumulative totals since
+        the start and per-interface rates since the previous sample. Pass
+        duration=None to sample until the generator is closed.
+        """
+        start_time = time.monotonic()
+        previous = psutil.net_io_counters(pernic=True)
+        previous_time = start_time
+        bytes_sent = 0
+        bytes_recv = 0
+        next_sample = start_time
         
-        while (datetime.datetime.now() - start_time).seconds < duration:
-            current_bytes = psutil.net_io_counters()
-            bytes_sent = current_bytes.bytes_sent - start_bytes.bytes_sent
-            bytes_recv = current_bytes.bytes_recv - start_bytes.bytes_recv
+        while duration is None or next_sample - start_time < duration:
+            # Schedule against the start time so samples do not drift
+            next_sample += interval
+            time.sleep(max(next_sample - time.monotonic(), 0))
+            current = psutil.net_io_counters(pernic=True)
+            sample_time = time.monotonic()
+            # Rates use the measured gap in case a sample ran late
+            period = sample_time - previous_time
+            
+            interfaces = {}
+            for name, counters in current.items():
+                if name not in previous:
+                    continue
+                deltas = {
+                    field: counter_delta(getattr(previous[name], field), getattr(counters, field))
+                    for field in RATE_FIELDS
+                }
+                bytes_sent += deltas["bytes_sent"]
+                bytes_recv += deltas["bytes_recv"]
+                interfaces[name] = {
+                    f"{field}_per_s": delta / period for field, delta in deltas.items()
+                }
+            previous = current
+            previous_time = sample_time
             
-            yield {
-                "timestamp": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            sample = {
+                "timestamp": time.strftime("%Y-%m-%d %H:%M:%S"),
+                "time": time.time(),
+                "elapsed": sample_time - start_time,
                 "bytes_sent": bytes_sent,
-                "bytes_received": bytes_recv
+                "bytes_received": bytes_recv,
+                "interfaces": interfaces
             }
+            if self.history:
+                self.history.add(sample)
+            yield sample
+
+    def monitor_process_traffic(self, duration=60, interval=2.0, top=10):
+        """Yield the top talking processes every interval seconds.
+
+        Pass duration=None to sample until the generator is closed.
+        """
+        sampler = ProcessTrafficSampler()
+        sampler.sample(top)  # Baseline counters for the first interval
+        start_time = time.monotonic()
+        next_sample = start_time
+        while duration is None or next_sample - start_time < duration:
+            next_sample += interval
+            time.sleep(max(next_sample - time.monotonic(), 0))
+            yield sampler.sample(top)
+
+    def generate_report(self, timeouts=None):
+        """Generate a comprehensive network report.
 
-    def generate_report(self):
-        """Generate a comprehensive network report"""
+        Probes run concurrently, each limited by its entry in PROBE_TIMEOUTS
+        (overridable through timeouts). A probe that fails or times out is
+        reported as an error instead of holding up the rest of the report.
+        """
+        defaults = dict(PROBE_TIMEOUTS)
+        if self.link_test_target and len(self.link_test_target) > 2:
+            # Download and upload each run for the test duration, then the latency probes
+            defaults["internet_speed"] = max(defaults["internet_speed"], 2 * self.link_test_target[2] + 30)
+        timeouts = {**defaults, **(timeouts or {})}
+        probes = {
+            "system_info": lambda: self.cached("system_info", STATIC_INFO_TTL, self.get_system_info),
+            "network_interfaces": self.get_network_interfaces,
+            "internet_speed": (
+                (lambda: self.test_link(*self.link_test_target))
+                if self.link_test_target else self.test_internet_speed
+            ),
+            "common_ports": lambda: self.check_port_status("localhost", [80, 443, 3306, 5432])
+        }
         report = {
-            "timestamp": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            "system_info": self.get_system_info(),
-            "network_interfaces": self.get_network_interfaces(),
-            "internet_speed": self.test_internet_speed(),
-            "common_ports": self.check_port_status("localhost", [80, 443, 3306, 5432])
+            "timestamp": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         }
+        
+        # Threads of timed-out probes cannot be stopped, so do not wait for them
+        pool = ThreadPoolExecutor(max_workers=len(probes))
+        start = time.monotonic()
+        futures = {name: pool.submit(probe) for name, probe in probes.items()}
+        for name, future in futures.items():
+            remaining = max(timeouts[name] - (time.monotonic() - start), 0)
+            try:
+                report[name] = future.result(timeout=remaining)
+            except FutureTimeoutError:
+                report[name] = {"error": f"Timed out after {timeouts[name]} seconds"}
+            except Exception as e:
+                report[name] = {"error": f"Probe failed: {str(e)}"}
+        pool.shutdown(wait=False)
 
         # Save report to file
         report_file = self.log_path / f"network_report_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
@@ -101,8 +837,183 @@ class NetworkMonitor:
 
         return report
 
+class NetworkDaemon:
+    """Keep sampling and port checking, and serve the latest state over HTTP.
+
+    Responses are rendered once per update and served from memory, so a
+    scrape never triggers a probe. GET /metrics returns Prometheus text
+    format and GET /json returns the same state as JSON.
+    """
+
+    def __init__(self, monitor, listen_host="0.0.0.0", listen_port=DAEMON_PORT, interval=5,
+                 port_check_host="localhost", port_check_ports=(80, 443, 3306, 5432),
+                 port_check_interval=60):
+        self.monitor = monitor
+        self.listen_host = listen_host
+        self.listen_port = listen_port
+        self.interval = interval
+        self.port_check_host = port_check_host
+        self.port_check_ports = list(port_check_ports)
+        self.port_check_interval = port_check_interval
+        self.started = time.time()
+        self.usage = None
+        self.ports = {}
+        self.render_lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.responses = {}
+        self.render()
+
+    def render(self):
+        """Pre-render the JSON and Prometheus responses from the current state"""
+        with self.render_lock:
+            usage = self.usage
+            state = {
+                "started": self.started,
+                "usage": usage,
+                "ports": {f"{host}:{port}": status for (host, port), status in self.ports.items()}
+            }
+            lines = [
+                "# TYPE network_monitor_start_time_seconds gauge",
+                f"network_monitor_start_time_seconds {self.started}",
+            ]
+            if usage:
+                lines += [
+                    "# TYPE network_monitor_last_sample_timestamp_seconds gauge",
+                    f"network_monitor_last_sample_timestamp_seconds {usage['time']}",
+                    "# TYPE network_monitor_bytes_total counter",
+                    f'network_monitor_bytes_total{{direction="sent"}} {usage["bytes_sent"]}',
+                    f'network_monitor_bytes_total{{direction="received"}} {usage["bytes_received"]}',
+                    "# TYPE network_monitor_interface_bytes_per_second gauge",
+                ]
+                for name, rates in usage["interfaces"].items():
+                    lines.append(f'network_monitor_interface_bytes_per_second{{interface="{name}",direction="sent"}} {rates["bytes_sent_per_s"]}')
+                    lines.append(f'network_monitor_interface_bytes_per_second{{interface="{name}",direction="received"}} {rates["bytes_recv_per_s"]}')
+                lines.append("# TYPE network_monitor_interface_packets_per_second gauge")
+                for name, rates in usage["interfaces"].items():
+                    lines.append(f'network_monitor_interface_packets_per_second{{interface="{name}",direction="sent"}} {rates["packets_sent_per_s"]}')
+                    lines.append(f'network_monitor_interface_packets_per_second{{interface="{name}",direction="received"}} {rates["packets_recv_per_s"]}')
+            if self.ports:
+                lines.append("# TYPE network_monitor_port_open gauge")
+                for (host, port), status in self.ports.items():
+                    lines.append(f'network_monitor_port_open{{host="{host}",port="{port}"}} {int(status == "Open")}')
+            
+            # Swap in a new dict so readers never see a partial update
+            self.responses = {
+                "/metrics": ("text/plain; version=0.0.4", ("\n".join(lines) + "\n").encode()),
+                "/json": ("application/json", json.dumps(state).encode())
+            }
+
+    def sample_usage(self):
+        """Feed usage samples into the state until the daemon stops"""
+        samples = self.monitor.monitor_network_usage(duration=None, interval=self.interval)
+        for sample in samples:
+            if self.stop_event.is_set():
+                break
+            self.usage = sample
+            self.render()
+        samples.close()
+
+    async def check_ports(self):
+        """Check the configured ports every port_check_interval seconds"""
+        while True:
+            results = {}
+            async for host, port, status in self.monitor.scan_ports_async(self.port_check_host, self.port_check_ports):
+                results[(host, port)] = status
+            self.ports = results
+            self.render()
+            await asyncio.sleep(self.port_check_interval)
+
+    async def handle_request(self, reader, writer):
+        """Answer one HTTP request from the pre-rendered responses"""
+        try:
+            request_line = await asyncio.wait_for(reader.readline(), 5)
+            # Skip headers, the responses do not depend on them
+            while (await asyncio.wait_for(reader.readline(), 5)) not in (b"\r\n", b"\n", b""):
+                pass
+            parts = request_line.decode("latin-1").split()
+            path = parts[1].split("?")[0] if len(parts) > 1 else "/"
+            response = self.responses.get("/json" if path == "/" else path)
+            if response is None:
+                status, content_type, body = "404 Not Found", "text/plain", b"Not Found\n"
+            else:
+                status = "200 OK"
+                content_type, body = response
+            writer.write(
+                f"HTTP/1.1 {status}\r\nContent-Type: {content_type}\r\n"
+                f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body
+            )
+            await writer.drain()
+        except (asyncio.TimeoutError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def run(self):
+        """Serve until cancelled"""
+        sampler = threading.Thread(target=self.sample_usage, daemon=True)
+        sampler.start()
+        server = await asyncio.start_server(self.handle_request, self.listen_host, self.listen_port)
+        port_checks = asyncio.ensure_future(self.check_ports())
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            port_checks.cancel()
+            self.stop_event.set()
+
 def main():
-    monitor = NetworkMonitor()
+    parser = argparse.ArgumentParser(description="Network monitoring tool")
+    parser.add_argument("--serve", action="store_true", help="Run a link test server and wait")
+    parser.add_argument("--link-test", metavar="HOST", help="Test against a link test server instead of speedtest.net")
+    parser.add_argument("--port", type=int, default=LINK_TEST_PORT, help="Link test server port")
+    parser.add_argument("--duration", type=float, default=5, help="Link test seconds per direction")
+    parser.add_argument("--streams", type=int, default=4, help="Parallel link test TCP streams")
+    parser.add_argument("--max-duration", type=float, default=LINK_TEST_MAX_DURATION, help="Longest stream the link test server runs, in seconds")
+    parser.add_argument("--top-talkers", type=int, metavar="N", help="Show the N processes moving the most data for 30 seconds")
+    parser.add_argument("--daemon", action="store_true", help="Keep monitoring and serve metrics over HTTP")
+    parser.add_argument("--listen-port", type=int, default=DAEMON_PORT, help="Daemon HTTP port")
+    parser.add_argument("--interval", type=float, default=5, help="Daemon sampling interval in seconds")
+    parser.add_argument("--port-check-interval", type=float, default=60, help="Seconds between daemon port checks")
+    args = parser.parse_args()
+    
+    if args.daemon:
+        daemon = NetworkDaemon(
+            NetworkMonitor(keep_history=True), listen_port=args.listen_port, interval=args.interval,
+            port_check_interval=args.port_check_interval
+        )
+        print(f"Serving metrics on port {args.listen_port} at /metrics and /json. Press Ctrl+C to stop.")
+        try:
+            asyncio.run(daemon.run())
+        except KeyboardInterrupt:
+            pass
+        return
+    
+    if args.serve:
+        server = LinkTestServer(port=args.port, max_duration=args.max_duration).start()
+        print(f"Link test server listening on port {server.port} (TCP and UDP). Press Ctrl+C to stop.")
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            server.stop()
+        return
+    
+    if args.top_talkers:
+        monitor = NetworkMonitor()
+        for sample in monitor.monitor_process_traffic(duration=30, top=args.top_talkers):
+            print(f"\n{sample['timestamp']} - {sample['processes']} processes with connections")
+            if "error" in sample:
+                print(f"  {sample['error']}")
+            for talker in sample["top_talkers"]:
+                print(
+                    f"  {talker['pid']:>7} {talker['name'][:20]:<20} "
+                    f"conns {talker['connections']:>4} | "
+                    f"in {talker['read_bytes_per_s'] / 1024:>10,.1f} KB/s | "
+                    f"out {talker['write_bytes_per_s'] / 1024:>10,.1f} KB/s"
+                )
+        return
+    
+    link_test_target = (args.link_test, args.port, args.duration, args.streams) if args.link_test else None
+    monitor = NetworkMonitor(link_test_target=link_test_target)
     
     print("Starting Network Monitoring Tool...")
     print("\n1. Generating system report...")
@@ -0,0 +1,99 @@
+import json
+import time
+import argparse
+import tempfile
+from pathlib import Path
+from selenium.webdriver.common.by import By
+
+from web_automator import WebAutomator
+
+def extract_page_info_per_element(driver):
+    """The previous extraction, one WebDriver round trip per element and attribute"""
+    info = {
+        'title': driver.title,
+        'url': driver.current_url,
+        'links': [],
+        'images': [],
+        'headers': []
+    }
+    for link in driver.find_elements(By.TAG_NAME, 'a'):
+        href = link.get_attribute('href')
+        text = link.text
+        if href and text:
+            info['links'].append({'text': text, 'href': href})
+    for img in driver.find_elements(By.TAG_NAME, 'img'):
+        src = img.get_attribute('src')
+        alt = img.get_attribute('alt')
+        if src:
+            info['images'].append({'src': src, 'alt': alt})
+    for h_level in range(1, 7):
+        for header in driver.find_elements(By.TAG_NAME, f'h{h_level}'):
+            info['headers'].append({'level': h_level, 'text': header.text})
+    return info
+
+def write_fixture(directory, links):
+    """Write a page with the given number of links and proportional images and headers.
+
+    A hidden menu checks that links and headers that are not rendered are
+    handled like WebDriver's .text, and an image without alt checks that its
+    alt is the empty string, as get_attribute returned it.
+    """
+    sections = [
+        '<nav style="display:none"><h2>Menu</h2>'
+        '<a href="menu/1.html">Hidden link</a><a href="menu/2.html">Another hidden link</a></nav>',
+        '<img src="img/no_alt.png">'
+    ]
+    for index in range(links):
+        if index % 50 == 0:
+            sections.append(f"<h{index // 50 % 6 + 1}>Section {index // 50}</h{index // 50 % 6 + 1}>")
+        if index % 10 == 0:
+            sections.append(f'<img src="img/{index}.png" alt="Image {index}">')
+        sections.append(f'<p><a href="page/{index}.html">Link {index}</a></p>')
+    path = Path(directory) / f"fixture_{links}.html"
+    path.write_text(f"<html><head><title>Fixture {links}</title></head><body>{''.join(sections)}</body></html>")
+    return path.as_uri()
+
+def time_call(func):
+    """Return (result, seconds) of one call"""
+    start = time.perf_counter()
+    result = func()
+    return result, time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare page extraction methods on local fixture pages")
+    parser.add_argument("--links", default="100,500,2000", help="Comma separated link counts per page")
+    parser.add_argument("--json", help="Also write results to this JSON file")
+    args = parser.parse_args()
+
+    results = []
+    automator = WebAutomator(headless=True)
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            print(f"{'links':>6} {'per-element':>12} {'script':>10} {'offline':>10}  match")
+            for links in [int(count) for count in args.links.split(",")]:
+                automator.navigate_to(write_fixture(directory, links))
+                legacy, legacy_time = time_call(lambda: extract_page_info_per_element(automator.driver))
+                script, script_time = time_call(automator.extract_page_info)
+                offline, offline_time = time_call(lambda: automator.extract_page_info(offline=True))
+                match = legacy == script
+                results.append({
+                    'links': links,
+                    'per_element_s': round(legacy_time, 4),
+                    'script_s': round(script_time, 4),
+                    'offline_s': round(offline_time, 4),
+                    'script_matches': match,
+                    # Offline parsing cannot see styles, so it also keeps the hidden links
+                    'offline_counts_match': all(
+                        len(offline[key]) == len(legacy[key]) for key in ('images', 'headers')
+                    )
+                })
+                print(f"{links:>6} {legacy_time:>11.3f}s {script_time:>9.3f}s {offline_time:>9.3f}s  {match}")
+    finally:
+        automator.close()
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=4)
+
+if __name__ == "__main__":
+    main()
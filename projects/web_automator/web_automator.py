@@ -1,23 +1,447 @@
+import io
 import time
 import logging
 import json
 import os
+import queue
+import hashlib
+import threading
+import multiprocessing.util
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 from selenium import webdriver
 from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import TimeoutException, NoSuchElementException
+from selenium.common.exceptions import TimeoutException
 from webdriver_manager.chrome import ChromeDriverManager
 from datetime import datetime
+from html.parser import HTMLParser
+from urllib.parse import urljoin, urlsplit
+
+try:
+    import lxml.html
+except ImportError:
+    lxml = None
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+# Collects the same structure as the per-element WebDriver calls it replaces:
+# links with both text and href, images with a src, and headers by level.
+# Like WebDriver's .text, elements that are not rendered have empty text.
+EXTRACT_PAGE_INFO_SCRIPT = """
+var text = function (element) {
+    if (!element.getClientRects().length || getComputedStyle(element).visibility === 'hidden') {
+        return '';
+    }
+    return (element.innerText || '').trim();
+};
+var info = {
+    title: document.title,
+    url: window.location.href,
+    links: [],
+    images: [],
+    headers: []
+};
+document.querySelectorAll('a').forEach(function (link) {
+    var href = typeof link.href === 'string' ? link.href : link.getAttribute('href');
+    var linkText = text(link);
+    if (href && linkText) {
+        info.links.push({text: linkText, href: href});
+    }
+});
+document.querySelectorAll('img').forEach(function (img) {
+    if (img.src) {
+        info.images.push({src: img.src, alt: img.alt});
+    }
+});
+for (var level = 1; level <= 6; level++) {
+    document.querySelectorAll('h' + level).forEach(function (header) {
+        info.headers.push({level: level, text: text(header)});
+    });
+}
+return info;
+"""
+
+class PageInfoParser(HTMLParser):
+    """Build the extract_page_info dict from HTML with the standard library parser"""
+    
+    def __init__(self, base_url):
+        super().__init__()
+        self.base_url = base_url
+        self.title = ''
+        self.links = []
+        self.images = []
+        self.headers = {level: [] for level in range(1, 7)}
+        self.open_tags = []
+        
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if tag == 'base' and attrs.get('href'):
+            self.base_url = urljoin(self.base_url, attrs['href'])
+        elif tag == 'img' and attrs.get('src'):
+            self.images.append({'src': urljoin(self.base_url, attrs['src']), 'alt': attrs.get('alt', '')})
+        elif tag in ('title', 'a') or (len(tag) == 2 and tag[0] == 'h' and tag[1] in '123456'):
+            self.open_tags.append((tag, attrs, []))
+            
+    def handle_data(self, data):
+        for _, _, parts in self.open_tags:
+            parts.append(data)
+            
+    def handle_endtag(self, tag):
+        for index in range(len(self.open_tags) - 1, -1, -1):
+            if self.open_tags[index][0] == tag:
+                _, attrs, parts = self.open_tags.pop(index)
+                self.add_element(tag, attrs, ' '.join(''.join(parts).split()))
+                break
+                
+    def add_element(self, tag, attrs, text):
+        if tag == 'title':
+            self.title = self.title or text
+        elif tag == 'a':
+            if attrs.get('href') and text:
+                self.links.append({'text': text, 'href': urljoin(self.base_url, attrs['href'])})
+        else:
+            self.headers[int(tag[1])].append({'level': int(tag[1]), 'text': text})
+
+def parse_page_info(html, url):
+    """Parse page_source into the dict returned by extract_page_info"""
+    if lxml is not None:
+        document = lxml.html.fromstring(html or '<html></html>', base_url=url)
+        document.make_links_absolute(url, resolve_base_href=True)
+        text = lambda element: ' '.join(element.text_content().split())
+        title = document.find('.//title')
+        return {
+            'title': text(title) if title is not None else '',
+            'url': url,
+            'links': [
+                {'text': text(link), 'href': link.get('href')}
+                for link in document.iter('a') if link.get('href') and text(link)
+            ],
+            'images': [
+                {'src': img.get('src'), 'alt': img.get('alt', '')}
+                for img in document.iter('img') if img.get('src')
+            ],
+            'headers': [
+                {'level': level, 'text': text(header)}
+                for level in range(1, 7) for header in document.iter(f'h{level}')
+            ]
+        }
+        
+    parser = PageInfoParser(url)
+    parser.feed(html)
+    parser.close()
+    return {
+        'title': parser.title,
+        'url': url,
+        'links': parser.links,
+        'images': parser.images,
+        'headers': [header for level in range(1, 7) for header in parser.headers[level]]
+    }
+
+# Seconds between checks of a wait condition
+POLL_INTERVAL = 0.1
+
+# URL patterns blocked by the scenario "block" option. Chrome matches them
+# against the whole URL, so the trailing * also covers query strings.
+BLOCK_PRESETS = {
+    'images': ['*.png*', '*.jpg*', '*.jpeg*', '*.gif*', '*.webp*', '*.svg*', '*.ico*'],
+    'css': ['*.css*'],
+    'fonts': ['*.woff*', '*.ttf*', '*.otf*'],
+    'media': ['*.mp4*', '*.webm*', '*.mp3*'],
+    'trackers': [
+        '*google-analytics.com*', '*googletagmanager.com*', '*doubleclick.net*',
+        '*facebook.net*', '*hotjar.com*', '*segment.io*'
+    ],
+}
+
+# Installed in every new document: counts fetch and XHR requests in flight
+# and lifts the resource timing buffer above Chrome's default of 250 entries
+NETWORK_TRACKER_SCRIPT = """
+(function () {
+    if (window.__pendingRequests !== undefined) { return; }
+    window.__pendingRequests = 0;
+    performance.setResourceTimingBufferSize(100000);
+    var done = function () { window.__pendingRequests--; };
+    var originalFetch = window.fetch;
+    if (originalFetch) {
+        window.fetch = function () {
+            window.__pendingRequests++;
+            try {
+                return originalFetch.apply(this, arguments).finally(done);
+            } catch (e) {
+                done();
+                throw e;
+            }
+        };
+    }
+    var originalSend = XMLHttpRequest.prototype.send;
+    XMLHttpRequest.prototype.send = function () {
+        window.__pendingRequests++;
+        this.addEventListener('loadend', done);
+        try {
+            return originalSend.apply(this, arguments);
+        } catch (e) {
+            this.removeEventListener('loadend', done);
+            done();
+            throw e;
+        }
+    };
+})();
+"""
+
+# Ready state, finished resource loads and requests in flight, used to detect network idle
+RESOURCE_COUNT_SCRIPT = (
+    "return [document.readyState, performance.getEntriesByType('resource').length,"
+    " window.__pendingRequests || 0];"
+)
+
+# Locator strategies tried for a form field, in order
+FIELD_LOCATORS = [By.ID, By.NAME, By.CSS_SELECTOR]
+
+# Finds and fills every field in one round trip. Values are set through the
+# native setter and announced with input and change events so frameworks such
+# as React see them. Fields that need real key events (listed in typeFields,
+# file inputs and contenteditable elements) are returned for send_keys instead,
+# as are disabled, readonly and hidden fields, so send_keys decides whether they
+# can be filled exactly as in per-field mode.
+FILL_FORM_SCRIPT = """
+var fields = arguments[0], cached = arguments[1], typeFields = arguments[2];
+var finders = {
+    'id': function (key) { return document.getElementById(key); },
+    'name': function (key) { return document.getElementsByName(key)[0] || null; },
+    'css selector': function (key) {
+        try { return document.querySelector(key); } catch (e) { return null; }
+    }
+};
+var result = {filled: {}, typed: {}, missing: []};
+Object.keys(fields).forEach(function (key) {
+    var strategies = ['id', 'name', 'css selector'];
+    if (cached[key]) {
+        strategies = [cached[key]].concat(strategies.filter(function (s) { return s !== cached[key]; }));
+    }
+    var element = null, strategy = null;
+    for (var i = 0; i < strategies.length && !element; i++) {
+        strategy = strategies[i];
+        element = finders[strategy](key);
+    }
+    if (!element) { result.missing.push(key); return; }
+    var hidden = !element.getClientRects().length || getComputedStyle(element).visibility === 'hidden';
+    if (typeFields.indexOf(key) !== -1 || element.isContentEditable || element.type === 'file' ||
+            element.disabled || element.readOnly || hidden) {
+        result.typed[key] = strategy;
+        return;
+    }
+    var value = fields[key];
+    if (element.type === 'checkbox' || element.type === 'radio') {
+        element.checked = Boolean(value);
+    } else {
+        var prototype = Object.getPrototypeOf(element);
+        var descriptor = Object.getOwnPropertyDescriptor(prototype, 'value');
+        if (descriptor && descriptor.set) {
+            descriptor.set.call(element, String(value));
+        } else {
+            element.value = String(value);
+        }
+    }
+    element.dispatchEvent(new Event('input', {bubbles: true}));
+    element.dispatchEvent(new Event('change', {bubbles: true}));
+    result.filled[key] = strategy;
+});
+return result;
+"""
+
+# Navigation Timing and Resource Timing entries for the current page
+PAGE_TIMING_SCRIPT = """
+var navigation = performance.getEntriesByType('navigation')[0];
+return {
+    navigation: navigation ? navigation.toJSON() : null,
+    resources: performance.getEntriesByType('resource').map(function (entry) {
+        return {
+            name: entry.name,
+            type: entry.initiatorType,
+            start: entry.startTime,
+            duration: entry.duration,
+            size: entry.transferSize
+        };
+    })
+};
+"""
+
+# (trace event name, start field, end field) of Navigation Timing phases
+NAVIGATION_PHASES = [
+    ('redirect', 'redirectStart', 'redirectEnd'),
+    ('dns', 'domainLookupStart', 'domainLookupEnd'),
+    ('connect', 'connectStart', 'connectEnd'),
+    ('request', 'requestStart', 'responseStart'),
+    ('response', 'responseStart', 'responseEnd'),
+    ('dom', 'responseEnd', 'domContentLoadedEventEnd'),
+    ('load', 'loadEventStart', 'loadEventEnd'),
+]
+
+_driver_path = None
+_driver_path_lock = threading.Lock()
+
+def get_driver_path():
+    """Install ChromeDriver once per process and return its path"""
+    global _driver_path
+    with _driver_path_lock:
+        if _driver_path is None:
+            _driver_path = ChromeDriverManager().install()
+        return _driver_path
+
+# File extension for each screenshot format
+SCREENSHOT_FORMATS = {'png': 'png', 'jpeg': 'jpg', 'webp': 'webp'}
+
+class ScreenshotWriter:
+    """Compress and save screenshots on a background thread.
+
+    submit() only hashes the PNG bytes and queues them, so the caller never
+    waits on encoding or disk I/O. A frame identical to the previous one is
+    not written again. After each write the oldest files are deleted until
+    the directory holds at most max_files screenshots and max_bytes bytes.
+    The limits are checked against the directory itself, so they hold for
+    all writers sharing it, such as the browsers of a ScenarioRunner.
+    JPEG and WebP need Pillow; without it screenshots stay PNG.
+    """
+    
+    def __init__(self, directory, image_format='png', quality=85, max_files=None,
+                 max_bytes=None, queue_size=32):
+        self.logger = logging.getLogger('WebAutomator')
+        if image_format not in SCREENSHOT_FORMATS:
+            raise ValueError(f"Unsupported screenshot format: {image_format}")
+        if image_format != 'png' and Image is None:
+            self.logger.warning(f"Pillow is not installed, saving screenshots as png instead of {image_format}")
+            image_format = 'png'
+        self.directory = directory
+        self.image_format = image_format
+        self.quality = quality
+        self.max_files = max_files
+        self.max_bytes = max_bytes
+        # (generation, digest, file name) of the last screenshot written; set
+        # by the writer thread and replaced as a whole so reads need no lock
+        self.last_saved = None
+        # Bumped by forget() so frames queued before it do not count as the last one
+        self.generation = 0
+        self.extensions = tuple(f".{extension}" for extension in SCREENSHOT_FORMATS.values())
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.thread = threading.Thread(target=self.run, name='screenshot-writer', daemon=True)
+        self.thread.start()
+        
+    def submit(self, name, png):
+        """Queue PNG bytes for saving and return the file name they will have.
+
+        Returns the previous file name if the frame is unchanged, or None if
+        the queue is full and the frame was dropped.
+        """
+        digest = hashlib.blake2b(png, digest_size=16).digest()
+        last_saved = self.last_saved
+        if last_saved and last_saved[:2] == (self.generation, digest) and os.path.exists(last_saved[2]):
+            self.logger.info(f"Screenshot unchanged, keeping {last_saved[2]}")
+            return last_saved[2]
+        filename = os.path.join(self.directory, f"{name}.{SCREENSHOT_FORMATS[self.image_format]}")
+        try:
+            self.queue.put_nowait((filename, png, digest, self.generation))
+        except queue.Full:
+            self.logger.error(f"Screenshot queue full, dropped {filename}")
+            return None
+        return filename
+        
+    def forget(self):
+        """Stop later frames from being matched against earlier ones, e.g. between scenarios"""
+        self.generation += 1
+        self.last_saved = None
+        
+    def encode(self, png):
+        """Convert PNG bytes to the configured format"""
+        if self.image_format == 'png':
+            return png
+        image = Image.open(io.BytesIO(png))
+        if self.image_format == 'jpeg':
+            image = image.convert('RGB')
+        output = io.BytesIO()
+        image.save(output, self.image_format.upper(), quality=self.quality)
+        return output.getvalue()
+        
+    def run(self):
+        """Write queued screenshots until a None sentinel arrives"""
+        while True:
+            item = self.queue.get()
+            try:
+                if item is None:
+                    return
+                filename, png, digest, generation = item
+                data = self.encode(png)
+                with open(filename, 'wb') as f:
+                    f.write(data)
+                if generation == self.generation:
+                    self.last_saved = (generation, digest, filename)
+                self.apply_retention()
+                self.logger.info(f"Screenshot saved: {filename}")
+            except Exception as e:
+                self.logger.error(f"Error saving screenshot: {str(e)}")
+            finally:
+                self.queue.task_done()
+                
+    def apply_retention(self):
+        """Delete the oldest screenshots in the directory until the limits are met"""
+        if self.max_files is None and self.max_bytes is None:
+            return
+        files = []
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if not entry.name.endswith(self.extensions):
+                    continue
+                try:
+                    stats = entry.stat()
+                except FileNotFoundError:
+                    continue  # Deleted by another writer
+                files.append((stats.st_mtime_ns, entry.path, stats.st_size))
+        files.sort()
+        count = len(files)
+        total = sum(size for _, _, size in files)
+        # The newest file is always kept
+        for _, path, size in files[:-1]:
+            if (self.max_files is None or count <= self.max_files) and (
+                self.max_bytes is None or total <= self.max_bytes
+            ):
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            count -= 1
+            total -= size
+                
+    def flush(self):
+        """Wait until every queued screenshot is written"""
+        self.queue.join()
+        
+    def close(self):
+        """Write the remaining screenshots and stop the writer thread"""
+        self.queue.put(None)
+        self.thread.join()
 
 class WebAutomator:
-    def __init__(self, headless=False):
+    def __init__(self, headless=False, page_load_strategy='normal', block_images=False,
+                 screenshot_format='png', screenshot_quality=85,
+                 screenshot_max_files=None, screenshot_max_bytes=None):
         self.setup_logging()
-        self.setup_driver(headless)
+        self.setup_driver(headless, page_load_strategy, block_images)
         self.screenshot_dir = "screenshots"
+        # Locator strategy that found each form field, cleared between scenarios
+        self.locator_cache = {}
+        # Origins loaded since the last reset, whose storage reset() clears
+        self.visited_origins = set()
         self.create_directories()
+        self.screenshot_writer = ScreenshotWriter(
+            self.screenshot_dir, screenshot_format, screenshot_quality,
+            screenshot_max_files, screenshot_max_bytes
+        )
         
     def setup_logging(self):
         logging.basicConfig(
@@ -33,124 +457,232 @@ class WebAutomator:
     def create_directories(self):
         os.makedirs(self.screenshot_dir, exist_ok=True)
         
-    def setup_driver(self, headless):
+    def setup_driver(self, headless, page_load_strategy='normal', block_images=False):
         chrome_options = Options()
         if headless:
             chrome_options.add_argument('--headless')
         chrome_options.add_argument('--start-maximized')
         chrome_options.add_argument('--disable-notifications')
+        # 'eager' returns from get() at DOMContentLoaded instead of the load event
+        chrome_options.page_load_strategy = page_load_strategy
+        if block_images:
+            chrome_options.add_experimental_option(
+                'prefs', {'profile.managed_default_content_settings.images': 2}
+            )
         
-        service = Service(ChromeDriverManager().install())
+        service = Service(get_driver_path())
         self.driver = webdriver.Chrome(service=service, options=chrome_options)
         self.wait = WebDriverWait(self.driver, 10)
+        try:
+            self.driver.execute_cdp_cmd('Page.addScriptToEvaluateOnNewDocument', {'source': NETWORK_TRACKER_SCRIPT})
+        except Exception as e:
+            self.logger.error(f"Error installing network tracker: {str(e)}")
         
     def navigate_to(self, url):
         """Navigate to a URL and wait for page load"""
         try:
             self.logger.info(f"Navigating to {url}")
+            self.visited_origins.add(url)
             self.driver.get(url)
+            # Redirects may end on another origin
+            self.visited_origins.add(self.driver.current_url)
             return True
         except Exception as e:
             self.logger.error(f"Error navigating to {url}: {str(e)}")
             return False
             
-    def wait_for_element(self, by, value, timeout=10):
+    def wait_for_element(self, by, value, timeout=10, condition=EC.presence_of_element_located):
         """Wait for element to be present and visible"""
         try:
-            element = WebDriverWait(self.driver, timeout).until(
-                EC.presence_of_element_located((by, value))
+            element = WebDriverWait(self.driver, timeout, poll_frequency=POLL_INTERVAL).until(
+                condition((by, value))
             )
             return element
         except TimeoutException:
             self.logger.error(f"Timeout waiting for element {value}")
             return None
             
+    def wait_for_document_ready(self, timeout=10):
+        """Wait until document.readyState is complete"""
+        try:
+            WebDriverWait(self.driver, timeout, poll_frequency=POLL_INTERVAL).until(
+                lambda driver: driver.execute_script("return document.readyState") == 'complete'
+            )
+            return True
+        except TimeoutException:
+            self.logger.error("Timeout waiting for document ready")
+            return False
+            
+    def wait_for_network_idle(self, idle_time=0.5, timeout=10):
+        """Wait until the page is loaded, no fetch or XHR is in flight and no
+        resource has finished for idle_time seconds"""
+        deadline = time.monotonic() + timeout
+        last_count = None
+        last_change = time.monotonic()
+        while time.monotonic() < deadline:
+            ready_state, count, pending = self.driver.execute_script(RESOURCE_COUNT_SCRIPT)
+            if count != last_count or pending or ready_state != 'complete':
+                last_count = count
+                last_change = time.monotonic()
+            elif time.monotonic() - last_change >= idle_time:
+                return True
+            time.sleep(POLL_INTERVAL)
+        self.logger.error("Timeout waiting for network idle")
+        return False
+        
+    def wait_until(self, step):
+        """Run a scenario wait step, either a fixed sleep or a condition"""
+        until = step.get('until')
+        timeout = step.get('timeout', 10)
+        if until is None:
+            time.sleep(step.get('seconds', 1))
+            return True
+        if until == 'document_ready':
+            return self.wait_for_document_ready(timeout)
+        if until == 'network_idle':
+            return self.wait_for_network_idle(step.get('idle_time', 0.5), timeout)
+        if until in ('element', 'visible', 'clickable'):
+            condition = {
+                'element': EC.presence_of_element_located,
+                'visible': EC.visibility_of_element_located,
+                'clickable': EC.element_to_be_clickable
+            }[until]
+            by = step.get('by', By.CSS_SELECTOR)
+            return self.wait_for_element(by, step['value'], timeout, condition) is not None
+        if until in ('url_contains', 'title_contains'):
+            condition = EC.url_contains if until == 'url_contains' else EC.title_contains
+            try:
+                WebDriverWait(self.driver, timeout, poll_frequency=POLL_INTERVAL).until(
+                    condition(step['value'])
+                )
+                return True
+            except TimeoutException:
+                self.logger.error(f"Timeout waiting for {until} {step['value']}")
+                return False
+        raise ValueError(f"Unknown wait condition: {until}")
+        
+    def set_blocked_urls(self, patterns):
+        """Block requests matching URL patterns through the DevTools protocol"""
+        try:
+            self.driver.execute_cdp_cmd('Network.enable', {})
+            self.driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': list(patterns)})
+            return True
+        except Exception as e:
+            self.logger.error(f"Error setting blocked URLs: {str(e)}")
+            return False
+            
     def take_screenshot(self, name=None):
-        """Take a screenshot of the current page"""
+        """Take a screenshot of the current page.
+
+        The image is saved in the background; call flush_screenshots() before
+        reading the returned file.
+        """
         if name is None:
             name = datetime.now().strftime("%Y%m%d_%H%M%S")
         try:
-            filename = f"{self.screenshot_dir}/{name}.png"
-            self.driver.save_screenshot(filename)
-            self.logger.info(f"Screenshot saved: {filename}")
-            return filename
+            return self.screenshot_writer.submit(name, self.driver.get_screenshot_as_png())
         except Exception as e:
             self.logger.error(f"Error taking screenshot: {str(e)}")
             return None
             
-    def fill_form(self, form_data):
-        """Fill a form using dictionary of field IDs/names and values"""
-        filled_fields = []
-        for field_id, value in form_data.items():
-            try:
-                # Try different locator strategies
-                element = None
-                for by in [By.ID, By.NAME, By.CSS_SELECTOR]:
-                    try:
-                        element = self.driver.find_element(by, field_id)
-                        break
-                    except NoSuchElementException:
-                        continue
-                        
-                if element:
-                    element.clear()
-                    element.send_keys(value)
-                    filled_fields.append(field_id)
-                    self.logger.info(f"Filled field {field_id}")
-            except Exception as e:
-                self.logger.error(f"Error filling field {field_id}: {str(e)}")
-                
-        return filled_fields
-        
-    def extract_page_info(self):
-        """Extract basic information from the current page"""
-        info = {
-            'title': self.driver.title,
-            'url': self.driver.current_url,
-            'links': [],
-            'images': [],
-            'headers': []
-        }
+    def flush_screenshots(self):
+        """Wait until every screenshot taken so far is on disk"""
+        self.screenshot_writer.flush()
         
-        # Extract links
-        links = self.driver.find_elements(By.TAG_NAME, 'a')
-        for link in links:
-            try:
-                href = link.get_attribute('href')
-                text = link.text
-                if href and text:
-                    info['links'].append({'text': text, 'href': href})
-            except:
-                continue
-                
-        # Extract images
-        images = self.driver.find_elements(By.TAG_NAME, 'img')
-        for img in images:
-            try:
-                src = img.get_attribute('src')
-                alt = img.get_attribute('alt')
-                if src:
-                    info['images'].append({'src': src, 'alt': alt})
-            except:
-                continue
-                
-        # Extract headers
-        for h_level in range(1, 7):
-            headers = self.driver.find_elements(By.TAG_NAME, f'h{h_level}')
-            for header in headers:
-                try:
-                    info['headers'].append({
-                        'level': h_level,
-                        'text': header.text
-                    })
-                except:
-                    continue
-                    
-        return info
+    def find_field(self, field_id):
+        """Find a form field by ID, name or CSS selector, trying the cached strategy first"""
+        cached = self.locator_cache.get(field_id)
+        strategies = [cached] + [by for by in FIELD_LOCATORS if by != cached] if cached else FIELD_LOCATORS
+        for by in strategies:
+            # find_elements returns an empty list instead of raising when nothing matches
+            elements = self.driver.find_elements(by, field_id)
+            if elements:
+                self.locator_cache[field_id] = by
+                return elements[0]
+        self.locator_cache.pop(field_id, None)
+        return None
         
+    def type_field(self, field_id, value):
+        """Clear a field and type the value with real key events"""
+        try:
+            element = self.find_field(field_id)
+            if element:
+                element.clear()
+                element.send_keys(value)
+                self.logger.info(f"Filled field {field_id}")
+                return True
+        except Exception as e:
+            self.logger.error(f"Error filling field {field_id}: {str(e)}")
+        return False
+        
+    def fill_form(self, form_data, batch=False, type_fields=()):
+        """Fill a form using dictionary of field IDs/names and values.
+
+        With batch=True every field is located and set in one execute_script
+        call that fires input and change events. Fields in type_fields, file
+        inputs and contenteditable elements are still typed with send_keys.
+        """
+        if not batch:
+            return [field_id for field_id, value in form_data.items() if self.type_field(field_id, value)]
+            
+        try:
+            result = self.driver.execute_script(
+                FILL_FORM_SCRIPT, form_data, self.locator_cache, list(type_fields)
+            )
+        except Exception as e:
+            self.logger.error(f"Error filling form in batch, typing fields instead: {str(e)}")
+            return self.fill_form(form_data)
+            
+        self.locator_cache.update(result['filled'])
+        self.locator_cache.update(result['typed'])
+        for field_id in result['missing']:
+            self.locator_cache.pop(field_id, None)
+            self.logger.error(f"Error filling field {field_id}: field not found")
+        if result['filled']:
+            self.logger.info(f"Filled fields {', '.join(result['filled'])}")
+        typed = [field_id for field_id in result['typed'] if self.type_field(field_id, form_data[field_id])]
+        return [field_id for field_id in form_data if field_id in result['filled'] or field_id in typed]
+        
+    def extract_page_info(self, offline=False):
+        """Extract basic information from the current page.
+
+        The page is read in a single execute_script round trip. With
+        offline=True, page_source is fetched once and parsed locally, which
+        avoids running script in the page but includes hidden text and uses
+        text content rather than rendered text.
+        """
+        if offline:
+            return parse_page_info(self.driver.page_source, self.driver.current_url)
+        return self.driver.execute_script(EXTRACT_PAGE_INFO_SCRIPT)
+        
+    def collect_page_timing(self):
+        """Return Navigation Timing and Resource Timing data for the current page"""
+        try:
+            return self.driver.execute_script(PAGE_TIMING_SCRIPT)
+        except Exception as e:
+            self.logger.error(f"Error collecting page timing: {str(e)}")
+            return None
+            
     def run_test_scenario(self, scenario):
-        """Run a test scenario defined in JSON format"""
+        """Run a test scenario defined in JSON format.
+
+        Every step records its start offset and duration in milliseconds.
+        With "collect_timing", navigate steps also record the browser's
+        Navigation and Resource Timing data. With "trace" set to a file name,
+        a Chrome trace-event JSON file of the scenario is written there.
+        """
         results = []
+        scenario_start = time.perf_counter()
+        self.locator_cache.clear()
+        # Resource blocking applies to this scenario only
+        blocked = list(scenario.get('block_urls', []))
+        for preset in scenario.get('block', []):
+            if preset in BLOCK_PRESETS:
+                blocked.extend(BLOCK_PRESETS[preset])
+            else:
+                self.logger.error(f"Unknown block preset {preset}, expected one of {', '.join(BLOCK_PRESETS)}")
+        if blocked:
+            self.set_blocked_urls(blocked)
         try:
             for step in scenario['steps']:
                 step_result = {
@@ -158,6 +690,7 @@ class WebAutomator:
                     'success': False,
                     'timestamp': datetime.now().strftime("%Y-%m-%d %H:%M:%S")
                 }
+                step_start = time.perf_counter()
                 
                 try:
                     if step['action'] == 'navigate':
@@ -165,7 +698,9 @@ class WebAutomator:
                         step_result['success'] = success
                         
                     elif step['action'] == 'fill_form':
-                        filled = self.fill_form(step['data'])
+                        filled = self.fill_form(
+                            step['data'], step.get('batch', False), step.get('type_fields', ())
+                        )
                         step_result['success'] = len(filled) == len(step['data'])
                         step_result['filled_fields'] = filled
                         
@@ -180,12 +715,15 @@ class WebAutomator:
                         step_result['info'] = info
                         
                     elif step['action'] == 'wait':
-                        time.sleep(step.get('seconds', 1))
-                        step_result['success'] = True
+                        step_result['success'] = self.wait_until(step)
                         
                 except Exception as e:
                     step_result['error'] = str(e)
                     
+                step_result['offset_ms'] = round((step_start - scenario_start) * 1000, 3)
+                step_result['duration_ms'] = round((time.perf_counter() - step_start) * 1000, 3)
+                if step['action'] == 'navigate' and scenario.get('collect_timing'):
+                    step_result['page_timing'] = self.collect_page_timing()
                 results.append(step_result)
                 
                 if not step_result['success'] and scenario.get('stop_on_error', True):
@@ -194,16 +732,186 @@ class WebAutomator:
         except Exception as e:
             self.logger.error(f"Error running scenario: {str(e)}")
             
+        if blocked:
+            self.set_blocked_urls([])
+        if scenario.get('trace'):
+            self.write_trace(scenario.get('name', 'scenario'), results, scenario['trace'])
         return results
         
+    def write_trace(self, scenario_name, results, filename):
+        """Write step results as Chrome trace-event JSON for chrome://tracing or Perfetto"""
+        pid = os.getpid()
+        events = [
+            {'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': tid, 'args': {'name': name}}
+            for tid, name in ((1, 'steps'), (2, 'navigation'), (3, 'resources'))
+        ]
+        end_ms = 0
+        for result in results:
+            start_ms = result['offset_ms']
+            end_ms = max(end_ms, start_ms + result['duration_ms'])
+            events.append({
+                'name': result['step_name'], 'cat': 'step', 'ph': 'X', 'pid': pid, 'tid': 1,
+                'ts': start_ms * 1000, 'dur': result['duration_ms'] * 1000,
+                'args': {'success': result['success'], 'error': result.get('error')}
+            })
+            timing = result.get('page_timing') or {}
+            # Browser times are relative to navigation start, taken as the step start
+            navigation = timing.get('navigation') or {}
+            for name, start_field, end_field in NAVIGATION_PHASES:
+                phase_start = navigation.get(start_field) or 0
+                phase_end = navigation.get(end_field) or 0
+                if phase_end > phase_start > 0:
+                    events.append({
+                        'name': name, 'cat': 'navigation', 'ph': 'X', 'pid': pid, 'tid': 2,
+                        'ts': (start_ms + phase_start) * 1000, 'dur': (phase_end - phase_start) * 1000
+                    })
+            for resource in timing.get('resources') or []:
+                events.append({
+                    'name': resource['name'], 'cat': resource['type'], 'ph': 'X', 'pid': pid, 'tid': 3,
+                    'ts': (start_ms + resource['start']) * 1000, 'dur': resource['duration'] * 1000,
+                    'args': {'size': resource['size']}
+                })
+        events.append({
+            'name': scenario_name, 'cat': 'scenario', 'ph': 'X', 'pid': pid, 'tid': 1,
+            'ts': 0, 'dur': end_ms * 1000
+        })
+        try:
+            with open(filename, 'w') as f:
+                json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f)
+            self.logger.info(f"Trace saved: {filename}")
+        except Exception as e:
+            self.logger.error(f"Error writing trace: {str(e)}")
+        
+    def reset(self):
+        """Close extra windows and clear cookies and the storage of visited origins.
+
+        Failing to clear some data is logged; only a browser that can no
+        longer be driven returns False, meaning it should be closed.
+        """
+        self.locator_cache.clear()
+        self.screenshot_writer.forget()
+        try:
+            handles = self.driver.window_handles
+            for index, handle in enumerate(handles):
+                self.driver.switch_to.window(handle)
+                self.visited_origins.add(self.driver.current_url)
+                try:
+                    # sessionStorage belongs to the tab, so clear it before leaving the page
+                    self.driver.execute_script("window.localStorage.clear(); window.sessionStorage.clear();")
+                except Exception:
+                    pass  # Pages such as about:blank have no storage
+                if index:
+                    self.driver.close()
+            self.driver.switch_to.window(handles[0])
+        except Exception as e:
+            self.logger.error(f"Error resetting browser: {str(e)}")
+            return False
+            
+        origins = {
+            f"{parts.scheme}://{parts.netloc}"
+            for parts in map(urlsplit, self.visited_origins) if parts.scheme in ('http', 'https')
+        }
+        self.visited_origins.clear()
+        for origin in origins:
+            try:
+                self.driver.execute_cdp_cmd('Storage.clearDataForOrigin', {'origin': origin, 'storageTypes': 'all'})
+            except Exception as e:
+                self.logger.error(f"Error clearing storage for {origin}: {str(e)}")
+        try:
+            self.driver.execute_cdp_cmd('Network.clearBrowserCookies', {})
+        except Exception as e:
+            self.logger.error(f"Error clearing cookies: {str(e)}")
+            
+        try:
+            self.driver.get("about:blank")
+            return True
+        except Exception as e:
+            self.logger.error(f"Error resetting browser: {str(e)}")
+            return False
+            
     def close(self):
         """Close the browser and clean up"""
+        self.screenshot_writer.close()
         try:
             self.driver.quit()
             self.logger.info("Browser closed successfully")
         except Exception as e:
             self.logger.error(f"Error closing browser: {str(e)}")
             
+class ScenarioRunner:
+    """Run scenarios in parallel on a pool of warm, reused browsers.
+
+    With threads, up to `workers` WebAutomator instances are created on
+    demand and reset between scenarios; they stay open for later runs until
+    close() is called. With use_processes, each worker process keeps one
+    browser for all the scenarios it runs.
+    """
+    
+    def __init__(self, workers=4, headless=True, use_processes=False, **driver_options):
+        self.workers = workers
+        # Passed to WebAutomator, e.g. page_load_strategy='eager'
+        self.driver_options = {'headless': headless, **driver_options}
+        self.use_processes = use_processes
+        self.idle = queue.Queue()
+        
+    def run(self, scenarios):
+        """Run scenarios and return their step results in the same order"""
+        if self.use_processes:
+            with ProcessPoolExecutor(
+                max_workers=self.workers,
+                initializer=_init_process_worker,
+                initargs=(self.driver_options,)
+            ) as pool:
+                return list(pool.map(_run_in_process_worker, scenarios))
+                
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            return list(pool.map(self.run_scenario, scenarios))
+            
+    def run_scenario(self, scenario):
+        """Run one scenario on an idle browser, starting one if none is free"""
+        try:
+            automator = self.idle.get_nowait()
+        except queue.Empty:
+            automator = WebAutomator(**self.driver_options)
+        try:
+            return automator.run_test_scenario(scenario)
+        finally:
+            if automator.reset():
+                self.idle.put(automator)
+            else:
+                # A browser that cannot be reset is likely dead; a new one starts on demand
+                automator.close()
+            
+    def close(self):
+        """Close every pooled browser"""
+        while True:
+            try:
+                self.idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+_process_automator = None
+_process_finalizer = None
+_process_driver_options = None
+
+def _init_process_worker(driver_options):
+    """Start the browser reused by one ScenarioRunner worker process"""
+    global _process_automator, _process_finalizer, _process_driver_options
+    _process_driver_options = driver_options
+    _process_automator = WebAutomator(**driver_options)
+    # Worker processes skip atexit handlers, but run multiprocessing finalizers
+    _process_finalizer = multiprocessing.util.Finalize(None, _process_automator.close, exitpriority=10)
+
+def _run_in_process_worker(scenario):
+    """Run one scenario on this worker process's browser"""
+    try:
+        return _process_automator.run_test_scenario(scenario)
+    finally:
+        if not _process_automator.reset():
+            # Closes the broken browser and unregisters its finalizer
+            _process_finalizer()
+            _init_process_worker(_process_driver_options)
+
 def main():
     # Example test scenario
     scenario = {